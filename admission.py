@@ -0,0 +1,132 @@
+"""
+Admission control: turn requests away quickly rather than let them queue for a long time.
+
+Sync handlers run on anyio's threadpool, and a request holds its pooled connection from its first
+query until it's done, across however many threads its dependencies and handler run on. If more
+requests ran at once than there are connections, threads would block waiting for one, and the
+threads that would return one may be stuck waiting for a thread.
+
+So ``AdmissionMiddleware`` lets at most ``capacity()`` requests run at once. The others wait
+their turn on the event loop, where waiting costs nothing. It estimates how long a new request
+would wait from how long requests take to serve, once they're running. If that's longer than
+``ADMISSION_MAX_WAIT_SECONDS``, it answers ``503`` with a ``Retry-After`` straight away instead.
+
+Streamed downloads, such as exports, run for as long as the client takes to read them, and fetch
+their rows on a session of their own. They're neither limited nor sampled: a single one would
+otherwise pass for minutes of service time, and turn everyone away.
+"""
+
+import math
+import time
+
+import anyio
+import anyio.to_thread
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import get_settings
+
+# Smoothing of the service time estimate, the weight of each new sample.
+_ALPHA = 0.1
+
+
+def threadpool_size() -> int:
+    settings = get_settings()
+    return settings.THREADPOOL_SIZE or settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+
+
+def capacity() -> int:
+    settings = get_settings()
+    return min(threadpool_size(), settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+
+
+class _Load:
+    """
+    Only ever touched from the event loop, so no lock.
+    """
+
+    def __init__(self) -> None:
+        self.slots = anyio.CapacityLimiter(capacity())
+        self.waiting = 0
+        self.service_time = 0.0
+        self.admitted = self.rejected = 0
+
+    def expected_wait(self) -> float:
+        """
+        For a request arriving now: those waiting ahead of it start ``capacity()`` at a time.
+        """
+        if self.slots.available_tokens:
+            return 0.0
+        return (
+            math.ceil((self.waiting + 1) / self.slots.total_tokens) * self.service_time
+        )
+
+
+_load: _Load | None = None
+
+
+def setup() -> None:
+    """
+    Size the threadpool and start counting afresh. Runs on the event loop, in the lifespan.
+    """
+    global _load
+
+    anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size()
+    _load = _Load()
+
+
+def stats() -> dict[str, float]:
+    if _load is None:
+        return {}
+    return {
+        "running": _load.slots.borrowed_tokens,
+        "waiting": _load.waiting,
+        "service_time_ms": round(_load.service_time * 1000, 3),
+        "admitted": _load.admitted,
+        "rejected": _load.rejected,
+    }
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp, streaming: tuple[str, ...] = ()) -> None:
+        """
+        ``streaming``: path prefixes of streamed downloads, let through as they come.
+        """
+        self.app = app
+        self.streaming = streaming
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        global _load
+
+        if scope["type"] != "http" or scope["path"].startswith(self.streaming):
+            await self.app(scope, receive, send)
+            return
+
+        if _load is None:
+            _load = _Load()
+        load = _load
+
+        wait = load.expected_wait()
+        if wait > get_settings().ADMISSION_MAX_WAIT_SECONDS:
+            load.rejected += 1
+            response = JSONResponse(
+                {"detail": "The server is busy, try again shortly"},
+                status_code=503,
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+            await response(scope, receive, send)
+            return
+
+        load.admitted += 1
+        load.waiting += 1
+        try:
+            await load.slots.acquire()
+        finally:
+            load.waiting -= 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            load.slots.release()
+            elapsed = time.perf_counter() - started
+            load.service_time += _ALPHA * (elapsed - load.service_time)
@@ -0,0 +1,87 @@
+"""
+Vectorized analytics over a ``columnar`` snapshot.
+
+The vote columns are walked ``chunk_size`` rows at a time, so memory stays bounded however long
+the history is; ``vote_winners`` is a few rows a day and is processed in one go.
+"""
+
+from collections.abc import Iterator
+
+import numpy as np
+import numpy.typing as npt
+
+from columnar import Column, Votes, Winners
+
+Counts = npt.NDArray[np.int64]
+
+CHUNK_SIZE = 1 << 20
+
+
+def _chunks(n: int, chunk_size: int) -> Iterator[slice]:
+    for start in range(0, n, chunk_size):
+        yield slice(start, start + chunk_size)
+
+
+def daily_counts(
+    votes: Votes, chunk_size: int = CHUNK_SIZE
+) -> tuple[Column, Column, Counts]:
+    """
+    Votes per restaurant per day, as ``(day, restaurant_id, count)`` columns sorted by day, then
+    restaurant.
+    """
+    keys: list[npt.NDArray[np.int64]] = []
+    counts: list[Counts] = []
+    for s in _chunks(len(votes.day), chunk_size):
+        key = (votes.day[s].astype(np.int64) << 32) | votes.restaurant_id[s]
+        k, c = np.unique(key, return_counts=True)
+        keys.append(k)
+        counts.append(c)
+
+    if not keys:
+        return np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.int64)
+
+    # A day can straddle two chunks, merge those partial counts.
+    k, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    c = np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+    return (k >> 32).astype(np.int32), (k & 0xFFFFFFFF).astype(np.int32), c
+
+
+def participation(
+    votes: Votes, employees: int, chunk_size: int = CHUNK_SIZE
+) -> tuple[Column, npt.NDArray[np.float64]]:
+    """
+    Share of ``employees`` that voted, per day that had any votes, as ``(day, rate)``. Nobody
+    votes twice on a day, so a day's vote count is its number of voters.
+    """
+    if len(votes.day) == 0:
+        return np.empty(0, np.int32), np.empty(0, np.float64)
+
+    first, last = int(votes.day.min()), int(votes.day.max())
+    per_day = np.zeros(last - first + 1, np.int64)
+    for s in _chunks(len(votes.day), chunk_size):
+        per_day += np.bincount(votes.day[s] - first, minlength=len(per_day))
+
+    voted = np.flatnonzero(per_day)
+    return (voted + first).astype(np.int32), per_day[voted] / employees
+
+
+def win_streaks(winners: Winners) -> tuple[Column, Counts]:
+    """
+    Longest run of consecutive wins per restaurant, as ``(restaurant_id, streak)``. Runs are
+    counted in voting days, days without winners (weekends, holidays) don't break them.
+    """
+    if len(winners.day) == 0:
+        return np.empty(0, np.int32), np.empty(0, np.int64)
+
+    day_rank = np.unique(winners.day, return_inverse=True)[1]
+    order = np.lexsort((day_rank, winners.restaurant_id))
+    restaurant_id, rank = winners.restaurant_id[order], day_rank[order]
+
+    run_starts = np.flatnonzero(
+        np.r_[True, (np.diff(restaurant_id) != 0) | (np.diff(rank) != 1)]
+    )
+    run_lengths = np.diff(np.r_[run_starts, len(restaurant_id)])
+
+    run_restaurant_id = restaurant_id[run_starts]
+    firsts = np.flatnonzero(np.r_[True, np.diff(run_restaurant_id) != 0])
+    return run_restaurant_id[firsts], np.maximum.reduceat(run_lengths, firsts)
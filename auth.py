@@ -1,16 +1,31 @@
+import hashlib
+import hmac
+import secrets
 from datetime import datetime, timedelta
+from functools import lru_cache
+from time import perf_counter
+from typing import TYPE_CHECKING
 
 from fastapi import HTTPException, status
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel, ValidationError
 
+import log
+import profiler
 from config import get_settings
 from models import Roles
 
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: str | None = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
@@ -20,15 +35,70 @@ class TokenData(BaseModel):
     restaurant_id: int | None = None
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def calibrate_bcrypt_rounds() -> int:
+    """
+    ``BCRYPT_ROUNDS`` if it's set, otherwise the highest cost in
+    ``[BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS]`` whose hash fits in ``BCRYPT_TARGET_MS`` here.
+    """
+    from passlib.context import CryptContext
+
+    settings = get_settings()
+    if settings.BCRYPT_ROUNDS is not None:
+        return settings.BCRYPT_ROUNDS
+
+    # The first hash loads the backend, keep that out of the measurement.
+    CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash("warmup")
+
+    rounds = settings.BCRYPT_MIN_ROUNDS
+    probe = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+    start = perf_counter()
+    probe.hash("calibration")
+    elapsed = perf_counter() - start
+
+    # Each extra round doubles the cost, so one measurement is enough to extrapolate from.
+    while (
+        rounds < settings.BCRYPT_MAX_ROUNDS
+        and elapsed * 2 <= settings.BCRYPT_TARGET_MS / 1000
+    ):
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+@lru_cache
+def get_pwd_context() -> "CryptContext":
+    """
+    Built on first use, so that importing ``main`` doesn't pay for passlib and its bcrypt backend.
+    Hashes below the calibrated cost are reported as needing an update, those at or above it
+    aren't: calibration differs between machines and boots, hashes only ever move up.
+    """
+    from passlib.context import CryptContext
+
+    rounds = calibrate_bcrypt_rounds()
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+    )
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Like :func:`verify_password`, but also returns a new hash of ``plain_password`` when
+    ``hashed_password`` was made with a lower cost, ``None`` otherwise.
+    """
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def encode_jwt(
@@ -60,7 +130,31 @@ def create_access_token(
     return Token(access_token=access_token)
 
 
+def hash_refresh_token(token: str) -> str:
+    """
+    Refresh tokens are long random strings, not something a person picked, so there's nothing to
+    brute force and a keyed SHA-256 is enough to store them; no bcrypt involved.
+    """
+    return hmac.new(
+        get_settings().REFRESH_TOKEN_SECRET_KEY.encode(),
+        token.encode(),
+        hashlib.sha256,
+    ).hexdigest()
+
+
+def new_refresh_token() -> tuple[str, str, datetime]:
+    """
+    Returns a new refresh token, the digest to store instead of it and when it expires.
+    """
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.utcnow() + timedelta(
+        seconds=get_settings().REFRESH_TOKEN_TTL_SECONDS
+    )
+    return token, hash_refresh_token(token), expires_at
+
+
 def unpack_jwt(token: str) -> TokenData:
+    profiler.attach()
     invalid_creds_exc = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -80,4 +174,5 @@ def unpack_jwt(token: str) -> TokenData:
     except JWTError:
         raise invalid_creds_exc
 
+    log.set_user(token_data.user_id)
     return token_data
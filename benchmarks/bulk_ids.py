@@ -0,0 +1,96 @@
+"""
+Menu operations over many item ids at once: assigning them to days, reading a day's menu,
+taking them off and deleting them, at 10, 1k and 100k ids by default::
+
+    python benchmarks/bulk_ids.py --sizes 10 1000 100000
+
+Each size runs against a fresh throwaway SQLite database holding one restaurant with that many
+items, once with menus kept as ``menu_items`` rows and once with ``MENU_DAYS_MASK``. The report
+is printed as JSON, seconds per operation, or the error it failed with.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def run(size: int, days_mask: bool) -> dict[str, Any]:
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+
+    import crud
+    import models
+    import schemas
+    from config import get_settings
+    from database import SessionLocal, engine
+
+    get_settings().MENU_DAYS_MASK = days_mask
+    with SessionLocal() as db:
+        models.Base.metadata.drop_all(db.get_bind())
+        crud.migrate(db)
+        crud.create_restaurant(db, schemas.RestaurantCreate(name="restaurant"))
+        db.execute(
+            insert(models.Item),
+            [
+                {"name": f"item{i}", "price": 100, "restaurant_id": 1}
+                for i in range(size)
+            ],
+        )
+        crud.rebuild_item_search(db)
+        db.commit()
+
+    ids = list(range(1, size + 1))
+    days = [models.Weekdays.MONDAY, models.Weekdays.TUESDAY, models.Weekdays.FRIDAY]
+    operations: dict[str, Callable[[Session], object]] = {
+        "add_item_to_daily_menu": lambda db: crud.add_item_to_daily_menu(
+            db, 1, days, ids
+        ),
+        "get_items": lambda db: crud.get_items(db, 1, days[0]),
+        "remove_item_from_daily_menu": lambda db: crud.remove_item_from_daily_menu(
+            db, 1, days, ids
+        ),
+        "delete_items": lambda db: crud.delete_items(db, 1, ids),
+    }
+
+    report: dict[str, Any] = {}
+    for name, operation in operations.items():
+        with SessionLocal() as db:
+            start = time.perf_counter()
+            try:
+                operation(db)
+                db.commit()
+                report[name] = round(time.perf_counter() - start, 4)
+            except Exception as e:
+                db.rollback()
+                report[name] = f"{type(e).__name__}: {str(e).splitlines()[0][:80]}"
+    engine.dispose()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{tmp}/bulk.sqlite3"
+        report = {
+            size: {
+                "menu_items": run(size, days_mask=False),
+                "days_mask": run(size, days_mask=True),
+            }
+            for size in args.sizes
+        }
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+End-to-end HTTP load test against an office-sized dataset.
+
+Generates the dataset once (employees, restaurants with menus, restaurateurs, and a vote history
+with winners), then drives the app through a series of scenarios modelled on a working day and
+prints throughput and latency percentiles per route as JSON::
+
+    python benchmarks/loadtest.py --database /tmp/load.sqlite3 --output before.json
+
+By default requests go to the app in-process, through httpx's ASGI transport. Pass
+``--base-url http://127.0.0.1:8000`` to hit a running uvicorn instead, started with the same
+``SQLALCHEMY_DATABASE_URL`` and ``VOTING_ENDS_AT=23:59:59``.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PASSWORD = "loadtest"
+ITEMS_PER_RESTAURANT = 20
+CHUNK = 10_000
+
+Request = tuple[str, str, dict[str, Any]]  # Method, path and httpx keyword arguments.
+
+
+def configure(args: argparse.Namespace) -> None:
+    """
+    Must run before the app's modules are imported, they read the settings on import.
+    """
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{args.database}"
+    # Keep voting open, the vote burst would otherwise depend on the time of day.
+    os.environ["VOTING_ENDS_AT"] = "23:59:59"
+    os.environ["VOTING_END_TIME_MARGIN"] = "0"
+    # Every simulated login comes from this one client.
+    os.environ["LOGIN_ATTEMPTS_PER_IP"] = str(10**9)
+
+
+def chunked(rows: Iterator[dict[str, Any]]) -> Iterator[list[dict[str, Any]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(args: argparse.Namespace) -> None:
+    from sqlalchemy import insert
+
+    import auth
+    import crud
+    import models
+    from database import SessionLocal
+
+    rng = random.Random(args.seed)
+    today = date.today()
+    # Hashing is the slow part of creating users, every generated user shares this one.
+    password = auth.get_password_hash(PASSWORD)
+
+    with SessionLocal() as db:
+        crud.migrate(db)
+        db.execute(
+            insert(models.Restaurant),
+            [{"name": f"restaurant{i}"} for i in range(1, args.restaurants + 1)],
+        )
+        for chunk in chunked(
+            {"name": f"item{r}-{i}", "price": rng.randint(50, 500), "restaurant_id": r}
+            for r in range(1, args.restaurants + 1)
+            for i in range(ITEMS_PER_RESTAURANT)
+        ):
+            db.execute(insert(models.Item), chunk)
+        crud.rebuild_item_search(db)  # Inserted behind ``crud.add_items``' back.
+        days = list(models.Weekdays)
+        for chunk in chunked(
+            {
+                "restaurant_id": (item - 1) // ITEMS_PER_RESTAURANT + 1,
+                "day": day,
+                "item_id": item,
+            }
+            for item in range(1, args.restaurants * ITEMS_PER_RESTAURANT + 1)
+            for day in rng.sample(days, 3)
+        ):
+            db.execute(insert(models.MenuItem), chunk)
+
+        for chunk in chunked(
+            {
+                "username": f"employee{i}",
+                "email": f"employee{i}@example.com",
+                "password": password,
+                "role": models.Roles.EMPLOYEE,
+            }
+            for i in range(1, args.employees + 1)
+        ):
+            db.execute(insert(models.User), chunk)
+        for chunk in chunked(
+            {
+                "username": f"restaurateur{r}",
+                "email": f"restaurateur{r}@example.com",
+                "password": password,
+                "role": models.Roles.RESTAURATEUR,
+                "restaurant_id": r,
+            }
+            for r in range(1, args.restaurants + 1)
+        ):
+            db.execute(insert(models.User), chunk)
+        db.commit()
+
+        # Some places are a lot more popular than others.
+        weights = [1 / r for r in range(1, args.restaurants + 1)]
+        voting_days = [today - timedelta(days=d) for d in range(args.days, 0, -1)]
+        for day in voting_days:
+            voters = rng.sample(
+                range(1, args.employees + 1), int(args.employees * args.participation)
+            )
+            picks = rng.choices(range(1, args.restaurants + 1), weights, k=len(voters))
+            for chunk in chunked(
+                {"user_id": u, "restaurant_id": r, "voting_date": day}
+                for u, r in zip(voters, picks)
+            ):
+                db.execute(insert(models.Vote), chunk)
+            db.commit()
+            crud.compute_winner(db, day)
+
+
+async def timed(
+    client: httpx.AsyncClient,
+    request: Request,
+    route: str,
+    samples: dict[str, list[float]],
+    errors: dict[str, int],
+) -> None:
+    method, path, kwargs = request
+    start = time.perf_counter()
+    r = await client.request(method, path, **kwargs)
+    samples[route].append(time.perf_counter() - start)
+    if r.status_code >= 400:
+        errors[route] += 1
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    requests: list[tuple[str, Request]],
+    concurrency: int,
+) -> dict[str, Any]:
+    samples: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    queue = iter(requests)
+
+    async def worker() -> None:
+        for route, request in queue:
+            await timed(client, request, route, samples, errors)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(requests),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(requests) / elapsed, 1),
+        "routes": {
+            route: summarize(latencies, errors[route])
+            for route, latencies in sorted(samples.items())
+        },
+    }
+
+
+def summarize(latencies: list[float], errors: int) -> dict[str, Any]:
+    ms = sorted(i * 1000 for i in latencies)
+    q = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {
+        "count": len(ms),
+        "errors": errors,
+        "p50_ms": round(q[49], 2),
+        "p95_ms": round(q[94], 2),
+        "p99_ms": round(q[98], 2),
+        "max_ms": round(ms[-1], 2),
+    }
+
+
+def scenarios(
+    args: argparse.Namespace,
+) -> dict[str, Callable[[random.Random], list[tuple[str, Request]]]]:
+    import auth
+    import models
+
+    def bearer(token: str) -> dict[str, Any]:
+        return {"headers": {"Authorization": f"Bearer {token}"}}
+
+    # Generated users have no root before them: employee ``i`` has id ``i``, restaurateurs come
+    # right after the employees.
+    def employee(i: int) -> dict[str, Any]:
+        return bearer(
+            auth.create_access_token(
+                i, f"employee{i}", models.Roles.EMPLOYEE
+            ).access_token
+        )
+
+    def restaurateur(r: int) -> dict[str, Any]:
+        return bearer(
+            auth.create_access_token(
+                args.employees + r,
+                f"restaurateur{r}",
+                models.Roles.RESTAURATEUR,
+                r,
+            ).access_token
+        )
+
+    def login_wave(rng: random.Random) -> list[tuple[str, Request]]:
+        return [
+            (
+                "POST /login",
+                (
+                    "POST",
+                    "/login",
+                    {
+                        "data": {
+                            "username": f"employee{rng.randint(1, args.employees)}",
+                            "password": PASSWORD,
+                        }
+                    },
+                ),
+            )
+            for _ in range(args.logins)
+        ]
+
+    def menu_browsing(rng: random.Random) -> list[tuple[str, Request]]:
+        requests: list[tuple[str, Request]] = []
+        for _ in range(args.requests):
+            if rng.random() < 0.5:
+                r = rng.randint(1, args.restaurants)
+                day = rng.choice(list(models.Weekdays))
+                requests.append(
+                    ("GET /menu/", ("GET", f"/menu/?day={day}", restaurateur(r)))
+                )
+            else:
+                e = rng.randint(1, args.employees)
+                requests.append(
+                    ("GET /vote/candidates", ("GET", "/vote/candidates", employee(e)))
+                )
+        return requests
+
+    def vote_burst(rng: random.Random) -> list[tuple[str, Request]]:
+        voters = rng.sample(
+            range(1, args.employees + 1), min(args.requests, args.employees)
+        )
+        return [
+            (
+                "POST /vote/{restaurant_id}",
+                (
+                    "POST",
+                    f"/vote/{rng.randint(1, args.restaurants)}",
+                    employee(e),
+                ),
+            )
+            for e in voters
+        ]
+
+    def winners_poll(rng: random.Random) -> list[tuple[str, Request]]:
+        return [
+            (
+                "GET /vote/winners",
+                (
+                    "GET",
+                    "/vote/winners",
+                    employee(rng.randint(1, args.employees)),
+                ),
+            )
+            for _ in range(args.requests)
+        ]
+
+    return {
+        "login_wave": login_wave,
+        "menu_browsing": menu_browsing,
+        "vote_burst": vote_burst,
+        "winners_poll": winners_poll,
+    }
+
+
+@asynccontextmanager
+async def connect(args: argparse.Namespace) -> AsyncIterator[httpx.AsyncClient]:
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+            yield client
+        return
+
+    import main
+
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),  # type: ignore[arg-type]
+            base_url="http://loadtest",
+            timeout=60,
+        ) as client:
+            yield client
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    report: dict[str, Any] = {"dataset": {}, "scenarios": {}}
+    for k in ("employees", "restaurants", "days", "participation"):
+        report["dataset"][k] = getattr(args, k)
+
+    async with connect(args) as client:
+        for name, build in scenarios(args).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            report["scenarios"][name] = await run_scenario(
+                client, build(rng), args.concurrency
+            )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", type=Path, default=Path("loadtest.sqlite3"))
+    parser.add_argument("--employees", type=int, default=50_000)
+    parser.add_argument("--restaurants", type=int, default=500)
+    parser.add_argument("--days", type=int, default=730, help="of vote history")
+    parser.add_argument(
+        "--participation", type=float, default=0.1, help="share voting each day"
+    )
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--scenario", action="append", help="run only these")
+    parser.add_argument("--base-url")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    configure(args)
+    if not args.database.exists():
+        start = time.perf_counter()
+        generate(args)
+        print(
+            f"dataset generated in {time.perf_counter() - start:.1f}s", file=sys.stderr
+        )
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        args.output.write_text(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
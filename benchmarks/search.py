@@ -0,0 +1,105 @@
+"""
+Menu search latency, full-text index against the substring fallback, over a generated menu::
+
+    python benchmarks/search.py --items 300000
+
+Items get names and descriptions drawn from a small vocabulary, so common words match many
+thousands of rows, and a number that's unique to each item. The report is printed as JSON, with p50/p95 per query in milliseconds.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+WORDS = (
+    "chicken beef mutton fish prawn egg rice noodles curry bhuna tikka masala kebab"
+    " biryani khichuri dal salad soup fried grilled spicy mild sweet sour lemon garlic"
+    " butter cheese paneer mushroom vegetable sandwich burger pizza pasta wrap roll"
+).split()
+QUERIES = [
+    "chicken",
+    "chick",
+    "spicy chicken curry",
+    "garlic butter prawn",
+    "pan",
+    "123456",
+]
+
+
+def generate(items: int, restaurants: int, seed: int) -> None:
+    from sqlalchemy import insert
+
+    import crud
+    import models
+    from database import SessionLocal
+
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        crud.migrate(db)
+        db.execute(
+            insert(models.Restaurant),
+            [{"name": f"restaurant{i}"} for i in range(1, restaurants + 1)],
+        )
+        db.execute(
+            insert(models.Item),
+            [
+                {
+                    "name": f"{' '.join(rng.sample(WORDS, 3))} {i}",
+                    "price": rng.randint(50, 900),
+                    "description": " ".join(rng.sample(WORDS, 6)),
+                    "restaurant_id": rng.randint(1, restaurants),
+                }
+                for i in range(items)
+            ],
+        )
+        crud.rebuild_item_search(db)
+        db.commit()
+
+
+def measure(runs: int) -> dict[str, dict[str, float]]:
+    import crud
+    from database import SessionLocal
+
+    def timings() -> dict[str, float]:
+        samples = []
+        with SessionLocal() as db:
+            for _ in range(runs):
+                t = time.perf_counter()
+                crud.search_items(db, q, max_price=500)
+                samples.append((time.perf_counter() - t) * 1000)
+        q95 = statistics.quantiles(samples, n=20)[18] if runs > 1 else samples[0]
+        return {"p50_ms": round(statistics.median(samples), 3), "p95_ms": round(q95, 3)}
+
+    report = {}
+    for q in QUERIES:
+        report[f"fts: {q}"] = timings()
+        with mock.patch.object(crud, "_has_item_search", return_value=False):
+            report[f"like: {q}"] = timings()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=300_000)
+    parser.add_argument("--restaurants", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{tmp}/search.sqlite3"
+        generate(args.items, args.restaurants, args.seed)
+        print(json.dumps(measure(args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Measures what a fresh worker pays before it's ready: importing ``main`` and running its lifespan.
+
+Every sample runs in a new interpreter against a throwaway SQLite database, and the report is
+printed as JSON so runs on different commits can be diffed::
+
+    python benchmarks/startup.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import asyncio, json, time
+
+t = time.perf_counter()
+import main
+imported = time.perf_counter() - t
+
+
+async def run_lifespan() -> float:
+    t = time.perf_counter()
+    async with main.lifespan(main.app):
+        return time.perf_counter() - t
+
+
+print(json.dumps({"import": imported, "lifespan": asyncio.run(run_lifespan())}))
+"""
+
+
+def sample(db_url: str) -> dict[str, float]:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT,
+        env=os.environ | {"SQLALCHEMY_DATABASE_URL": db_url},
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    timings: dict[str, float] = json.loads(out.splitlines()[-1])
+    return timings
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    ms = sorted(v * 1000 for v in values)
+    return {
+        "min_ms": round(ms[0], 2),
+        "median_ms": round(statistics.median(ms), 2),
+        "max_ms": round(ms[-1], 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{tmp}/startup.sqlite3"
+        cold = sample(db_url)  # Empty database, tables get created.
+        warm = [sample(db_url) for _ in range(args.runs)]
+
+    print(
+        json.dumps(
+            {
+                "runs": args.runs,
+                "cold_lifespan_ms": round(cold["lifespan"] * 1000, 2),
+                "import": summarize([s["import"] for s in warm]),
+                "lifespan": summarize([s["lifespan"] for s in warm]),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
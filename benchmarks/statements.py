@@ -0,0 +1,90 @@
+"""
+Per-call cost of the hottest ``crud`` queries, against a small throwaway SQLite database, so
+that what's measured is mostly building, compiling and running the statement in Python::
+
+    python benchmarks/statements.py --calls 5000
+
+The report is printed as JSON, microseconds per call.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def measure(calls: int) -> dict[str, float]:
+    from sqlalchemy.orm import Session
+
+    import crud
+    import models
+    import schemas
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        crud.migrate(db)
+        crud.create_restaurant(db, schemas.RestaurantCreate(name="restaurant"))
+        crud.add_items(
+            db,
+            1,
+            [models.Weekdays.MONDAY],
+            [schemas.ItemCreate(name=f"item{i}", price=100) for i in range(10)],
+        )
+        crud.add_items(
+            db,
+            1,
+            None,
+            [schemas.ItemCreate(name=f"other{i}", price=100) for i in range(5)],
+        )
+        db.add(
+            models.User(
+                username="employee",
+                password="-",
+                email="e@example.com",
+                role="employee",
+            )
+        )
+        db.commit()
+        crud.vote(db, 1, 1)  # Every vote after this one is a conflict, nothing grows.
+
+    today = date.today()
+    queries: dict[str, Callable[[Session], object]] = {
+        "get_user": lambda db: crud.get_user(db, "employee"),
+        "vote": lambda db: crud.vote(db, 1, 1),
+        "get_items(day)": lambda db: crud.get_items(db, 1, models.Weekdays.MONDAY),
+        "get_items(unassigned)": lambda db: crud.get_items(db, 1, None),
+        "get_items(all)": lambda db: crud.get_items(db, 1, None, all=True),
+        "get_winners": lambda db: crud.get_winners(db, today),
+    }
+
+    report = {}
+    for name, query in queries.items():
+        with SessionLocal() as db:
+            query(db)  # Warm the compiled cache.
+            start = time.perf_counter()
+            for _ in range(calls):
+                query(db)
+                db.expunge_all()
+            report[name] = round((time.perf_counter() - start) / calls * 1e6, 1)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{tmp}/statements.sqlite3"
+        print(json.dumps(measure(args.calls), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Menu catalog shared by every worker process on a node.
+
+Every restaurant's menus are serialized, as the JSON ``GET /menu/`` answers with, into a single
+file under ``CATALOG_DIR`` that each worker maps read-only, so the page cache holds one copy
+however many workers there are. It's stamped with the ``menu_generation`` it was built from.
+
+After a commit that changed menus, ``publish_soon`` has a background thread rebuild it, with a
+connection of its own, however many commits came meanwhile. ``publish`` builds under an
+exclusive ``flock``, so one process builds at a time, unless the catalog is already as recent,
+and swaps it in with ``os.replace``. Readers notice the new file by its inode and remap, mappings
+of the old one stay valid until they're dropped. A failed build leaves the last catalog in
+place, and is retried. Until this process' own writes are in, it reads menus from the database.
+
+Layout, little-endian::
+
+    header   magic, format version, generation, restaurants
+    ids      restaurant ids, ascending, u32 each
+    slots    per restaurant, (offset, length) of its menu per day in ``Weekdays`` order, then
+             of its unassigned items and of all its items, u32 each
+    data     the JSON fragments
+"""
+
+import fcntl
+import logging
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Sequence
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+
+import models
+import schemas
+from config import get_settings
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LPC1"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sIQI")
+DAYS = list(models.Weekdays)
+UNASSIGNED = len(DAYS)
+ALL = UNASSIGNED + 1
+SLOTS = ALL + 1
+
+_items_json = TypeAdapter(list[schemas.Item])
+
+
+def _path() -> Path | None:
+    directory = get_settings().CATALOG_DIR
+    return None if directory is None else Path(directory) / "catalog.bin"
+
+
+def _serialize(db: Session) -> bytes:
+    # Read before the data it's built from, which may then only be more recent.
+    generation = db.scalar(select(models.MenuGeneration.generation)) or 0
+    stmt = select(models.Restaurant.id, models.Item).outerjoin(
+        models.Item, models.Item.restaurant_id == models.Restaurant.id
+    )
+    rows: Sequence[tuple[int, models.Item | None, models.Weekdays | None]]
+    if get_settings().MENU_DAYS_MASK:
+        # A row per day it's on, as the join with ``menu_items`` would give.
+        rows = [
+            (restaurant_id, item, day)
+            for restaurant_id, item in db.execute(
+                stmt.order_by(models.Restaurant.id, models.Item.id)
+            )
+            for day in (item and models.Weekdays.in_mask(item.days)) or [None]
+        ]
+    else:
+        rows = (
+            db.execute(
+                stmt.add_columns(models.MenuItem.day)
+                .outerjoin(models.MenuItem, models.MenuItem.item_id == models.Item.id)
+                .order_by(models.Restaurant.id, models.Item.id)
+            )
+            .tuples()
+            .all()
+        )
+
+    menus: dict[int, list[list[models.Item]]] = defaultdict(
+        lambda: [[] for _ in range(SLOTS)]
+    )
+    assigned: set[int] = set()
+    for restaurant_id, item, day in rows:
+        slots = menus[restaurant_id]
+        if item is None:
+            continue
+        if not slots[ALL] or slots[ALL][-1] is not item:
+            slots[ALL].append(item)
+        if day is not None:
+            slots[DAYS.index(day)].append(item)
+            assigned.add(item.id)
+    for slots in menus.values():
+        slots[UNASSIGNED] = [i for i in slots[ALL] if i.id not in assigned]
+
+    ids = sorted(menus)
+    data_start = HEADER.size + 4 * len(ids) + 8 * SLOTS * len(ids)
+    fragments: list[bytes] = []
+    index: list[int] = []
+    offset = data_start
+    for restaurant_id in ids:
+        for items in menus[restaurant_id]:
+            fragment = _items_json.dump_json(items)  # type: ignore[arg-type]
+            fragments.append(fragment)
+            index += (offset, len(fragment))
+            offset += len(fragment)
+
+    return b"".join(
+        [
+            HEADER.pack(MAGIC, FORMAT_VERSION, generation, len(ids)),
+            struct.pack(f"<{len(ids)}I", *ids),
+            struct.pack(f"<{len(index)}I", *index),
+            *fragments,
+        ]
+    )
+
+
+def _read_generation(path: Path) -> int | None:
+    """
+    Generation of the catalog at ``path``, ``None`` if there's none.
+    """
+    try:
+        with path.open("rb") as f:
+            magic, version, generation, _ = HEADER.unpack(f.read(HEADER.size))
+    except (FileNotFoundError, struct.error):
+        return None
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+    return int(generation)
+
+
+def publish(generation: int = 0, session: sessionmaker[Session] = SessionLocal) -> bool:
+    """
+    Rebuild the catalog, unless it's already at ``generation`` or later. Returns whether it's
+    now there, ``True`` too when ``CATALOG_DIR`` isn't set and there's nothing to do.
+    """
+    path = _path()
+    if path is None:
+        return True
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with (path.parent / "catalog.lock").open("a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        current = _read_generation(path)
+        if current is not None and current >= generation:
+            return True
+
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with session() as db:
+                tmp.write_bytes(_serialize(db))
+            os.replace(tmp, path)
+            return True
+        except Exception:
+            logger.exception("could not publish the menu catalog")
+            tmp.unlink(missing_ok=True)
+            return False
+
+
+# Seconds between attempts once a build failed.
+_RETRY_SECONDS = 1.0
+
+# The latest generation this process committed, and the latest it saw published, since the last
+# ``reset``. Guarded by ``_progress``, which the publisher thread waits on.
+_written = _published = _resets = 0
+_progress = threading.Condition()
+_publisher: threading.Thread | None = None
+
+
+def _publish_pending() -> None:
+    global _published
+
+    while True:
+        with _progress:
+            _progress.wait_for(lambda: _published < _written)
+            wanted, resets = _written, _resets
+        try:
+            done = publish(wanted)
+        except Exception:  # E.g. ``CATALOG_DIR`` can't be written to.
+            logger.exception("could not publish the menu catalog")
+            done = False
+        if not done:
+            time.sleep(_RETRY_SECONDS)
+            continue
+        with _progress:
+            if resets == _resets:
+                _published = max(_published, wanted)
+            _progress.notify_all()
+
+
+def publish_soon(generation: int) -> None:
+    """
+    Have the catalog rebuilt up to ``generation``, which this process just committed, in the
+    background.
+    """
+    global _written, _publisher
+
+    if _path() is None:
+        return
+    with _progress:
+        _written = max(_written, generation)
+        if _publisher is None:
+            _publisher = threading.Thread(
+                target=_publish_pending, name="catalog-publisher", daemon=True
+            )
+            _publisher.start()
+        _progress.notify_all()
+
+
+def flush(timeout: float | None = None) -> bool:
+    """
+    Wait for this process' writes to be published. Returns whether they were in time.
+    """
+    with _progress:
+        return _progress.wait_for(lambda: _published >= _written, timeout)
+
+
+def reset() -> None:
+    """
+    Forget this process' writes, for when the database was recreated.
+    """
+    global _written, _published, _resets
+
+    with _progress:
+        _written = _published = 0
+        _resets += 1
+        _progress.notify_all()
+
+
+class _Mapped:
+    def __init__(self, path: Path) -> None:
+        with path.open("rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self.map = mmap(f.fileno(), 0, access=ACCESS_READ)
+        _, _, self.generation, n = HEADER.unpack_from(self.map)
+        self.view = view = memoryview(self.map)
+        self.ids = view[HEADER.size : HEADER.size + 4 * n].cast("I")
+        self.slots = view[HEADER.size + 4 * n : HEADER.size + 4 * n * (1 + 2 * SLOTS)]
+        self.slots = self.slots.cast("I")
+
+
+_mapped: _Mapped | None = None
+_map_lock = threading.Lock()
+
+
+def _current() -> _Mapped | None:
+    """
+    The published catalog, remapped if it was replaced since it was last looked at.
+    """
+    global _mapped
+
+    path = _path()
+    if path is None:
+        return None
+    try:
+        inode = path.stat().st_ino
+    except FileNotFoundError:
+        _mapped = None
+        return None
+
+    mapped = _mapped
+    if mapped is None or mapped.inode != inode:
+        with _map_lock:
+            mapped = _mapped
+            if mapped is None or mapped.inode != inode:
+                try:
+                    mapped = _mapped = _Mapped(path)
+                except (FileNotFoundError, ValueError, struct.error):
+                    return None  # Replaced or removed meanwhile, or still empty.
+    return mapped
+
+
+def generation() -> int | None:
+    mapped = _current()
+    return None if mapped is None else mapped.generation
+
+
+def menu(
+    restaurant_id: int, day: models.Weekdays | None, all: bool
+) -> memoryview | None:
+    """
+    ``crud.get_items`` as JSON, a view into the mapping rather than a copy. ``None`` if it's not
+    in the catalog: no catalog, one older than this process' writes, or the restaurant was added
+    after the catalog was built.
+    """
+    mapped = _current()
+    if mapped is None or mapped.generation < _written:
+        return None
+    i = bisect_left(mapped.ids, restaurant_id)
+    if i == len(mapped.ids) or mapped.ids[i] != restaurant_id:
+        return None
+
+    slot = ALL if all else UNASSIGNED if day is None else DAYS.index(day)
+    offset, length = mapped.slots[2 * (i * SLOTS + slot) : 2 * (i * SLOTS + slot) + 2]
+    return mapped.view[offset : offset + length]
@@ -0,0 +1,129 @@
+"""
+Columnar snapshots of the vote history, for analytics that shouldn't go through the ORM.
+
+``export`` streams ``votes`` and ``vote_winners`` out in chunks into one ``.npy`` file per column,
+ids as ``int32`` and dates as ``int32`` day ordinals (``date.toordinal``). ``load`` maps them back
+read-only, so only the pages that are actually touched end up in memory.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+from numpy.lib.format import open_memmap
+from sqlalchemy import func, select
+from sqlalchemy.orm import QueryableAttribute, Session
+
+import models
+
+Column = npt.NDArray[np.int32]
+
+
+class Votes(NamedTuple):
+    user_id: Column
+    restaurant_id: Column
+    day: Column
+
+
+class Winners(NamedTuple):
+    restaurant_id: Column
+    day: Column
+    votes: Column
+
+
+class Snapshot(NamedTuple):
+    votes: Votes
+    winners: Winners
+    employees: int  # At the time of the export.
+
+
+def _export_table(
+    db: Session,
+    table: str,
+    id_column: QueryableAttribute[int],
+    columns: dict[str, QueryableAttribute[Any]],
+    directory: Path,
+    chunk_size: int,
+) -> None:
+    # Cut at the highest id seen now, rows added while the export runs are left out.
+    last_id = db.scalar(select(func.max(id_column))) or 0
+    n = db.scalar(select(func.count(id_column)).where(id_column <= last_id)) or 0
+    stmt = (
+        select(*columns.values())
+        .where(id_column <= last_id)
+        .order_by(id_column)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    arrays = [
+        open_memmap(  # type: ignore[no-untyped-call]
+            directory / f"{table}.{name}.npy", mode="w+", dtype=np.int32, shape=(n,)
+        )
+        for name in columns
+    ]
+    i = 0
+    for chunk in db.execute(stmt).partitions():
+        for name, array, values in zip(columns, arrays, zip(*chunk)):
+            if name == "day":
+                values = tuple(d.toordinal() for d in values)
+            array[i : i + len(chunk)] = values
+        i += len(chunk)
+
+    for array in arrays:
+        array.flush()
+
+
+def export(db: Session, directory: Path, chunk_size: int = 100_000) -> Snapshot:
+    """
+    Write the snapshot into ``directory``, holding at most ``chunk_size`` rows in memory at a
+    time, and return it mapped.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    _export_table(
+        db,
+        models.Vote.__tablename__,
+        models.Vote.id,
+        {
+            "user_id": models.Vote.user_id,
+            "restaurant_id": models.Vote.restaurant_id,
+            "day": models.Vote.voting_date,
+        },
+        directory,
+        chunk_size,
+    )
+    _export_table(
+        db,
+        models.VoteWinner.__tablename__,
+        models.VoteWinner.id,
+        {
+            "restaurant_id": models.VoteWinner.restaurant_id,
+            "day": models.VoteWinner.voting_date,
+            "votes": models.VoteWinner.votes,
+        },
+        directory,
+        chunk_size,
+    )
+
+    employees = db.scalar(
+        select(func.count(models.User.id)).where(
+            models.User.role == models.Roles.EMPLOYEE
+        )
+    )
+    (directory / "meta.json").write_text(json.dumps({"employees": employees}))
+    return load(directory)
+
+
+def load(directory: Path) -> Snapshot:
+    def columns(table: str, names: tuple[str, ...]) -> list[Column]:
+        return [
+            np.load(directory / f"{table}.{name}.npy", mmap_mode="r") for name in names
+        ]
+
+    meta = json.loads((directory / "meta.json").read_text())
+    return Snapshot(
+        votes=Votes(*columns(models.Vote.__tablename__, Votes._fields)),
+        winners=Winners(*columns(models.VoteWinner.__tablename__, Winners._fields)),
+        employees=meta["employees"],
+    )
@@ -17,15 +17,76 @@ class Settings(BaseSettings):
         "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
     )
     JWT_ALGORITHM: str = "HS256"
+    REFRESH_TOKEN_TTL_SECONDS: int = 30 * 24 * 3600
+    REFRESH_TOKEN_SECRET_KEY: str = (
+        "5f0b3c8e2d71a9c4e6b8f1a3d5c7e9b2a4c6e8f0b1d3f5a7c9e1b3d5f7a9c2e4"
+    )
     ROOT_USERNAME: str = "root"
     ROOT_PASSWORD: str = ""
     ROOT_EMAIL: str = "root@email.com"
     SQLALCHEMY_DATABASE_URL: str = "sqlite:///./db.sqlite3"
 
+    # Handlers hold a pooled connection while they run, so by default the handler threadpool is
+    # as big as the pool and no thread waits for a connection. Waiting for one times out after
+    # ``DB_POOL_TIMEOUT`` seconds with a ``503``. Requests that would wait longer than
+    # ``ADMISSION_MAX_WAIT_SECONDS`` in line are turned away upfront, see ``admission``.
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 5.0
+    THREADPOOL_SIZE: int | None = None
+    ADMISSION_MAX_WAIT_SECONDS: float = 2.0
+
+    # bcrypt work factor. If ``BCRYPT_ROUNDS`` isn't set, it's calibrated on startup to the
+    # highest cost within bounds that hashes in at most ``BCRYPT_TARGET_MS`` on this machine.
+    BCRYPT_ROUNDS: int | None = None
+    BCRYPT_TARGET_MS: int = 250
+    BCRYPT_MIN_ROUNDS: int = 10
+    BCRYPT_MAX_ROUNDS: int = 14
+
+    # Login attempts let through per username and per client IP within the window, see
+    # ``ratelimit``. Each limit tracks at most ``LOGIN_LIMIT_MAX_KEYS`` usernames or IPs.
+    LOGIN_ATTEMPTS_PER_USERNAME: int = 10
+    LOGIN_ATTEMPTS_PER_IP: int = 100
+    LOGIN_WINDOW_SECONDS: float = 60.0
+    LOGIN_LIMIT_MAX_KEYS: int = 100_000
+
+    # Requests are profiled when an admin sends ``X-Profile``, or at this rate, see ``profiler``.
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_MS: float = 1.0
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_DIR_MAX_BYTES: int = 50 * 1024 * 1024
+
+    # Bulk menu operations bind at most ``IN_CHUNK_SIZE`` ids per statement, and go through a
+    # temporary table past ``IN_TEMP_TABLE_THRESHOLD`` ids.
+    IN_CHUNK_SIZE: int = 500
+    IN_TEMP_TABLE_THRESHOLD: int = 10_000
+
+    # Keep which days' menus an item is on as a bitmask on the item, ``items.days``, rather than
+    # as ``menu_items`` rows. Menus move over on the next startup, see ``crud.sync_menu_storage``.
+    MENU_DAYS_MASK: bool = False
+
+    # Where the menu catalog the worker processes share is kept, unset to go without, see
+    # ``catalog``.
+    CATALOG_DIR: str | None = None
+
+    # See ``log``. Past ``LOG_OVERLOAD_THRESHOLD`` of the queue, records below ``WARNING`` are
+    # sampled at ``LOG_OVERLOAD_SAMPLE_RATE``.
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10_000
+    LOG_OVERLOAD_THRESHOLD: float = 0.8
+    LOG_OVERLOAD_SAMPLE_RATE: float = 0.1
+
+    # Daily database upkeep, see ``maintenance``. Its vacuum frees ``MAINTENANCE_VACUUM_PAGES``
+    # pages per transaction, until ``MAINTENANCE_BUDGET_SECONDS`` are up.
+    MAINTENANCE_AT: time = time.fromisoformat("15")
+    MAINTENANCE_BUDGET_SECONDS: float = 5.0
+    MAINTENANCE_VACUUM_PAGES: int = 1000
+    MAINTENANCE_ANALYSIS_LIMIT: int = 1000
+
     VOTING_ENDS_AT: time = time.fromisoformat("12")
     VOTING_END_TIME_MARGIN: timedelta = timedelta(seconds=10)
 
-    @field_validator("VOTING_ENDS_AT", mode="before")
+    @field_validator("VOTING_ENDS_AT", "MAINTENANCE_AT", mode="before")
     def parse_time(cls, v: str | time) -> time:
         if isinstance(v, time):
             return v
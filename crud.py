@@ -1,28 +1,194 @@
-from collections.abc import Sequence
-from datetime import date, datetime
+import enum
+import fcntl
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Collection, Iterator, Sequence
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any
 
-from sqlalchemy import Row, desc, insert, or_, select, text
-from sqlalchemy.orm import Session, sessionmaker
+from pydantic import TypeAdapter
+from sqlalchemy import (ColumnElement, Date, Engine, Integer, Row, Select,
+                        bindparam, cast, column, delete, event, func, insert,
+                        inspect, literal, literal_column, or_, select, table,
+                        text, type_coerce, union_all, update)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Mapped, QueryableAttribute, Session, sessionmaker
+from sqlalchemy.sql.dml import Insert, ReturningInsert
 from sqlalchemy.sql.functions import count
 
 import auth
+import catalog
 import models
 import schemas
 from config import get_settings
-from database import SessionLocal, engine
+from database import SessionLocal
 from models import Base
 
+logger = logging.getLogger(__name__)
 
-def create_root_user(db: Session) -> None:
+
+class Outcome(enum.StrEnum):
+    CREATED = enum.auto()
+    CONFLICT = (
+        enum.auto()
+    )  # A unique constraint already covers such a row, nothing written.
+    MISSING_REFERENCE = (
+        enum.auto()
+    )  # Refers to a row that doesn't exist, nothing written.
+
+
+def _insert(db: Session, model: type[Base]) -> sqlite.Insert | postgresql.Insert:
     """
-    Should run on startup. Create all tables and check if there is at least one admin. If not, create one.
+    ``INSERT`` for the session's dialect, for its ``ON CONFLICT DO NOTHING``. Conflicts then
+    cost neither a failed statement nor a rollback, ``RETURNING`` says whether a row went in.
     """
-    Base.metadata.create_all(engine)
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
 
-    if db.query(models.User).filter(models.User.role == models.Roles.ADMIN).count() > 0:
+
+# Upgrade steps keyed by the schema version they upgrade *to*. Each one runs after
+# ``create_all`` has added any brand new tables, so it only has to deal with changes to
+# existing ones (and data).
+MIGRATIONS: dict[int, Callable[[Session], object]] = {}
+
+
+# Bumped once a commit that changed menus or candidates went through. Only this process' writes
+# are seen, ``shared_menu_generation`` counts every process'.
+_menu_generation = 0
+_menu_generation_lock = threading.Lock()
+
+
+def menu_generation() -> int:
+    return _menu_generation
+
+
+def shared_menu_generation(db: Session) -> int:
+    return db.scalar(select(models.MenuGeneration.generation)) or 0
+
+
+def _menus_changed(db: Session) -> None:
+    db.info["menus_changed"] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _count_menu_changes(db: Session) -> None:
+    """
+    Bump ``menu_generation`` in the transaction that changed menus, so it's seen with them.
+    """
+    if db.info.get("menus_changed"):
+        db.info["menus_changed"] = db.scalar(
+            _insert(db, models.MenuGeneration)
+            .values(id=1, generation=1)
+            .on_conflict_do_update(
+                index_elements=[models.MenuGeneration.id],
+                set_={"generation": models.MenuGeneration.generation + 1},
+            )
+            .returning(models.MenuGeneration.generation)
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_menu_generation(db: Session) -> None:
+    global _menu_generation
+
+    generation = db.info.pop("menus_changed", None)
+    if generation:
+        with _menu_generation_lock:
+            _menu_generation += 1
+        # The session still holds its connection here, the rebuild happens on another thread.
+        catalog.publish_soon(generation)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_menu_changes(db: Session) -> None:
+    db.info.pop("menus_changed", None)
+
+
+def get_schema_version(db: Session) -> int | None:
+    try:
+        return db.scalar(select(models.SchemaVersion.version))
+    except (OperationalError, ProgrammingError):  # No ``schema_version`` table yet.
+        db.rollback()
+        return None
+
+
+def migrate(db: Session) -> bool:
+    """
+    Should run on startup. Costs a single query when the schema is already at
+    ``models.SCHEMA_VERSION``, otherwise creates the missing tables and runs the pending upgrade
+    steps. Returns whether anything had to be done.
+    """
+    if get_schema_version(db) == models.SCHEMA_VERSION:
+        return False
+    db.commit()  # Nothing held while waiting for the lock.
+
+    with _migration_lock(db):
+        # Another process may have upgraded it while this one waited.
+        current = get_schema_version(db)
+        if current == models.SCHEMA_VERSION:
+            return False
+
+        # Databases that predate ``schema_version`` are at version 1, empty ones need no
+        # upgrades.
+        fresh = not inspect(db.connection()).has_table(models.User.__tablename__)
+        Base.metadata.create_all(db.connection())
+        if not fresh:
+            for version in range((current or 1) + 1, models.SCHEMA_VERSION + 1):
+                if version in MIGRATIONS:
+                    MIGRATIONS[version](db)
+
+        db.execute(delete(models.SchemaVersion))
+        db.add(models.SchemaVersion(version=models.SCHEMA_VERSION))
+        db.commit()
+    logger.info("schema upgraded", extra={"from": current, "to": models.SCHEMA_VERSION})
+    return True
+
+
+# Any constant will do, as long as nothing else takes the same advisory lock.
+_MIGRATION_LOCK_KEY = 0x6C756E6368
+
+
+@contextmanager
+def _migration_lock(db: Session) -> Iterator[None]:
+    """
+    Held by one process at a time, for the whole upgrade, as every worker migrates on startup:
+    an advisory lock on PostgreSQL, a ``flock`` on a file next to the database on SQLite.
+    """
+    engine = db.get_bind().engine
+    if engine.dialect.name == "postgresql":
+        # On a connection of its own, the session's goes back to the pool when steps commit.
+        with engine.connect() as connection:
+            connection.execute(select(func.pg_advisory_lock(_MIGRATION_LOCK_KEY)))
+            try:
+                yield
+            finally:
+                connection.execute(select(func.pg_advisory_unlock(_MIGRATION_LOCK_KEY)))
         return
 
-    hashed_password = auth.pwd_context.hash(get_settings().ROOT_PASSWORD)
+    database = engine.url.database
+    if not database or database == ":memory:":  # Private to the process.
+        yield
+        return
+    with open(f"{database}.migrate.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def create_root_user(db: Session) -> bool:
+    """
+    One-time bootstrap, run by ``python manage.py create-root-user``. Check if there is at least
+    one admin. If not, create one. Returns whether the root user was created.
+    """
+    if db.query(models.User).filter(models.User.role == models.Roles.ADMIN).count() > 0:
+        return False
+
+    hashed_password = auth.get_password_hash(get_settings().ROOT_PASSWORD)
 
     db.add(
         models.User(
@@ -33,45 +199,176 @@ def create_root_user(db: Session) -> None:
         )
     )
     db.commit()
+    logger.info("root user created", extra={"username": get_settings().ROOT_USERNAME})
+    return True
+
+
+# The hottest queries are built once, with their arguments as bound parameters: every call then
+# reuses the statement, its cache key and its compiled form, rather than building them over.
+_user_by_name = select(models.User).where(models.User.username == bindparam("username"))
+
+
+def get_user(db: Session, username: str) -> models.User | None:
+    return db.scalar(_user_by_name, {"username": username})
 
 
-def is_email_username_registered(
-    db: Session, email: str, username: str
-) -> tuple[bool, bool]:
-    l = (
-        db.query(models.User)
-        .filter(or_(models.User.username == username, models.User.email == email))
-        .all()
+def set_password_hash(db: Session, user: models.User, hashed_password: str) -> None:
+    """
+    Doesn't commit, the change goes out with the rest of the request's unit of work.
+    """
+    user.password = hashed_password
+    db.add(user)
+
+
+def create_refresh_token(
+    db: Session, user_id: int, token_hash: str, expires_at: datetime
+) -> None:
+    db.add(
+        models.RefreshToken(
+            user_id=user_id, token_hash=token_hash, expires_at=expires_at
+        )
     )
 
-    u = False
-    e = False
-    for i in l:
-        if i.username == username:
-            u = True
-        if i.email == email:
-            e = True
 
-    return (u, e)
+def rotate_refresh_token(
+    db: Session, token_hash: str, new_token_hash: str, expires_at: datetime
+) -> models.User | None:
+    """
+    Consume a refresh token and store its replacement. Returns the owner, or ``None`` if the token
+    is unknown, already used or expired. The old token is deleted in the same statement that reads
+    it, so two concurrent refreshes can't both succeed.
+    """
+    old = db.execute(
+        delete(models.RefreshToken)
+        .where(models.RefreshToken.token_hash == token_hash)
+        .returning(models.RefreshToken.user_id, models.RefreshToken.expires_at)
+    ).first()
+    if old is None or old.expires_at < datetime.utcnow():
+        return None
 
+    create_refresh_token(db, old.user_id, new_token_hash, expires_at)
+    return db.get(models.User, old.user_id)
 
-def get_user(db: Session, username: str) -> models.User | None:
-    return db.query(models.User).filter(models.User.username == username).first()
+
+def purge_refresh_tokens(db: Session) -> int:
+    """
+    Delete expired refresh tokens, returns how many.
+    """
+    n = db.execute(
+        delete(models.RefreshToken).where(
+            models.RefreshToken.expires_at < datetime.utcnow()
+        )
+    ).rowcount
+    db.commit()
+    return n
+
+
+def get_restaurant(db: Session, restaurant_id: int) -> models.Restaurant | None:
+    return db.get(models.Restaurant, restaurant_id)
 
 
 def create_restaurant(
     db: Session, restaurant: schemas.RestaurantCreate
-) -> models.Restaurant:
-    empty_menus = [
-        models.DailyMenu(**(schemas.DailyMenuCreate(day=dm, items=[])).model_dump())
-        for dm in models.Weekdays
-    ]
+) -> tuple[Outcome, models.Restaurant | None]:
+    """
+    ``CONFLICT`` if the name is taken.
+    """
+    r = db.scalar(
+        _insert(db, models.Restaurant)
+        .values(**restaurant.model_dump())
+        .on_conflict_do_nothing()
+        .returning(models.Restaurant)
+    )
+    if r is None:
+        return Outcome.CONFLICT, None
 
-    r = models.Restaurant(**(restaurant.model_dump() | {"daily_menus": empty_menus}))
-    db.add(r)
+    _add_candidates(db, [r.id])
+    _menus_changed(db)
     db.commit()
     db.refresh(r)
-    return r
+    return Outcome.CREATED, r
+
+
+# Rows per multi-row ``INSERT``, well within SQLite's limit on bound parameters.
+_ROWS_PER_INSERT = 500
+
+
+def _insert_rows(
+    db: Session, stmt: Insert, rows: list[dict[str, Any]]
+) -> list[Row[Any]]:
+    """
+    ``stmt`` with ``rows`` as its ``VALUES``, ``_ROWS_PER_INSERT`` at a time. Returns what its
+    ``RETURNING`` returned, if it has one.
+    """
+    returned: list[Row[Any]] = []
+    for i in range(0, len(rows), _ROWS_PER_INSERT):
+        result = db.execute(stmt.values(rows[i : i + _ROWS_PER_INSERT]))
+        if stmt.exported_columns:
+            returned += result.all()
+    return returned
+
+
+def create_restaurants(
+    db: Session, restaurants: Sequence[schemas.RestaurantCreate]
+) -> list[tuple[Outcome, int | None]]:
+    """
+    ``create_restaurant`` for many at once, in one transaction. Per
+    restaurant, in order, ``CONFLICT`` if the name is taken, also when by an earlier one in
+    ``restaurants``, else the new id.
+    """
+    rows: dict[str, dict[str, Any]] = {}
+    for r in restaurants:
+        rows.setdefault(r.name, r.model_dump())
+    new = _insert_rows(
+        db,
+        _insert(db, models.Restaurant)
+        .on_conflict_do_nothing()
+        .returning(models.Restaurant.name, models.Restaurant.id),
+        list(rows.values()),
+    )
+    ids: dict[str, int] = {name: i for name, i in new}
+
+    if ids:
+        _add_candidates(db, ids.values())
+        _menus_changed(db)
+    db.commit()
+
+    outcomes: list[tuple[Outcome, int | None]] = []
+    for r in restaurants:
+        i = ids.pop(r.name, None)
+        outcomes.append((Outcome.CONFLICT, None) if i is None else (Outcome.CREATED, i))
+    return outcomes
+
+
+_items_of = select(models.Item).where(
+    models.Item.restaurant_id == bindparam("restaurant_id")
+)
+_items_on_day = (
+    select(models.Item)
+    .join(models.MenuItem, models.MenuItem.item_id == models.Item.id)
+    .where(
+        models.MenuItem.restaurant_id == bindparam("restaurant_id"),
+        models.MenuItem.day == bindparam("day"),
+    )
+    .order_by(models.Item.id)
+)
+_items_unassigned = _items_of.where(
+    ~select(models.MenuItem.item_id)
+    .where(models.MenuItem.item_id == models.Item.id)
+    .exists()
+).order_by(models.Item.id)
+_items_all = _items_of.order_by(models.Item.id)
+_items_by_day = (
+    select(models.Item, models.MenuItem.day)
+    .outerjoin(models.MenuItem, models.MenuItem.item_id == models.Item.id)
+    .where(models.Item.restaurant_id == bindparam("restaurant_id"))
+    .order_by(models.Item.id)
+)
+# With ``MENU_DAYS_MASK``, both within ``ix_items_restaurant_days``.
+_items_on_day_mask = _items_of.where(
+    models.Item.days.bitwise_and(bindparam("bit")) != 0
+).order_by(models.Item.id)
+_items_unassigned_mask = _items_of.where(models.Item.days == 0).order_by(models.Item.id)
 
 
 def get_items(
@@ -80,24 +377,41 @@ def get_items(
     day: models.Weekdays | None,
     all: bool = False,
 ) -> list[models.Item]:
-    qry = db.query(models.Item).where(models.Item.restaurant_id == restaurant_id)
-    if not all:
-        sieve = (
-            db.query(models.AssocItemDailyMenu.item_id)
-            .join(models.Item)
-            .where(models.Item.restaurant_id == restaurant_id)
-        )
+    params: dict[str, Any] = {"restaurant_id": restaurant_id}
+    mask = get_settings().MENU_DAYS_MASK
+    if all:
+        stmt = _items_all
+    elif day is None:
+        stmt = _items_unassigned_mask if mask else _items_unassigned
+    elif mask:
+        stmt, params["bit"] = _items_on_day_mask, day.bit
+    else:
+        stmt, params["day"] = _items_on_day, day
+    return list(db.scalars(stmt, params))
 
-        if day is not None:
-            items_filter = models.Item.id.in_(
-                sieve.join(models.DailyMenu).where(models.DailyMenu.day == day)
-            )
-        else:
-            items_filter = models.Item.id.not_in(sieve)
 
-        qry = qry.where(items_filter)
-    items = qry.all()
-    return items
+def get_week(db: Session, restaurant_id: int) -> schemas.WeekMenu:
+    """
+    All the restaurant's items, and which of them are on each day's menu, in one query.
+    """
+    week = schemas.WeekMenu(items=[], days={day: [] for day in models.Weekdays})
+    params = {"restaurant_id": restaurant_id}
+    if get_settings().MENU_DAYS_MASK:
+        for item in db.scalars(_items_all, params):
+            week.items.append(schemas.Item.model_validate(item))
+            for day in models.Weekdays.in_mask(item.days):
+                week.days[day].append(item.id)
+        return week
+
+    last = None
+    # An item comes once per day it's on, in a row, or once with no day.
+    for item, day in db.execute(_items_by_day, params).tuples():
+        if item is not last:
+            week.items.append(schemas.Item.model_validate(item))
+            last = item
+        if day is not None:
+            week.days[day].append(item.id)
+    return week
 
 
 def add_items(
@@ -111,89 +425,450 @@ def add_items(
         for i in items
     ]
     db.bulk_save_objects(new_items, return_defaults=True)
-    if days:
+    if _has_item_search(db):
         db.execute(
-            insert(models.AssocItemDailyMenu).values(
-                [
-                    {
-                        "item_id": i.id,
-                        "daily_menu_id": select(models.DailyMenu.id).where(
-                            models.DailyMenu.restaurant_id == restaurant_id,
-                            models.DailyMenu.day == day,
-                        ),
-                    }
-                    for i in new_items
-                    for day in days
-                ]
-            )
+            insert(_items_fts),
+            [
+                {"rowid": i.id, "name": i.name, "description": i.description}
+                for i in new_items
+            ],
         )
+    if days:
+        add_item_to_daily_menu(db, restaurant_id, days, [i.id for i in new_items])
+    _menus_changed(db)
     db.commit()
     return new_items
 
 
-def delete_items(db: Session, restaurant_id: int, ids: list[int]) -> int:
-    db.query(models.AssocItemDailyMenu).where(
-        models.AssocItemDailyMenu.item_id.in_(ids)
-    ).delete()
-    return (
-        db.query(models.Item)
-        .where(models.Item.restaurant_id == restaurant_id, models.Item.id.in_(ids))
-        .delete()
+# Bulk deletes otherwise fetch every deleted key back, to expire the matching objects in the
+# session. Menu operations don't load the rows they delete.
+_UNSYNCHRONIZED = {"synchronize_session": False}
+
+# Scratch table for id sets too large to go in a statement, see ``_in_batches``. Temporary
+# tables are private to the connection, and the session's connection is the same throughout
+# its transaction.
+_batch_ids = table("batch_ids", column("id"))
+
+
+def _in_batches(
+    db: Session, column: QueryableAttribute[Any], ids: Collection[int]
+) -> Iterator[ColumnElement[bool]]:
+    """
+    ``column IN ids``, split in conditions to run one statement each with, so that no statement
+    has more than ``IN_CHUNK_SIZE`` of them bound. Past ``IN_TEMP_TABLE_THRESHOLD`` ids, they're
+    loaded in a temporary table instead, and the one condition selects from it.
+    """
+    settings = get_settings()
+    if len(ids) <= settings.IN_TEMP_TABLE_THRESHOLD:
+        ordered = list(ids)
+        for i in range(0, len(ordered), settings.IN_CHUNK_SIZE):
+            yield column.in_(ordered[i : i + settings.IN_CHUNK_SIZE])
+        return
+
+    db.execute(
+        text(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {_batch_ids.name} (id INTEGER PRIMARY KEY)"
+        )
+    )
+    db.execute(delete(_batch_ids))
+    # Straight to the driver, one parameter per row: no limit to run into, and none of the
+    # per-row cost of binding through SQLAlchemy.
+    connection = db.connection()
+    placeholder = "?" if connection.dialect.paramstyle == "qmark" else "%s"
+    connection.exec_driver_sql(
+        f"INSERT INTO {_batch_ids.name} (id) VALUES ({placeholder})",
+        [(i,) for i in set(ids)],
     )
+    yield column.in_(select(_batch_ids.c.id))
+
+
+def delete_items(db: Session, restaurant_id: int, ids: Collection[int]) -> int:
+    deleted = 0
+    for in_batch in _in_batches(db, models.Item.id, ids):
+        owned = select(models.Item.id).where(
+            models.Item.restaurant_id == restaurant_id, in_batch
+        )
+        if _has_item_search(db):
+            # External content tables are told what to unindex, while the rows still exist.
+            db.execute(
+                insert(_items_fts).from_select(
+                    [_items_fts.c[models.ITEMS_FTS], "rowid", "name", "description"],
+                    select(
+                        literal("delete"),
+                        models.Item.id,
+                        models.Item.name,
+                        models.Item.description,
+                    ).where(models.Item.id.in_(owned)),
+                )
+            )
+        if not get_settings().MENU_DAYS_MASK:
+            db.execute(
+                delete(models.MenuItem).where(models.MenuItem.item_id.in_(owned)),
+                execution_options=_UNSYNCHRONIZED,
+            )
+        deleted += db.execute(
+            delete(models.Item).where(models.Item.id.in_(owned)),
+            execution_options=_UNSYNCHRONIZED,
+        ).rowcount
+    _menus_changed(db)
+    return deleted
 
 
 def add_item_to_daily_menu(
-    db: Session, restaurant_id: int, days: list[models.Weekdays], ids: list[int]
+    db: Session, restaurant_id: int, days: list[models.Weekdays], ids: Collection[int]
 ) -> int:
-    return db.execute(
-        insert(models.AssocItemDailyMenu).values(
-            [
-                {
-                    "item_id": i,
-                    "daily_menu_id": select(models.DailyMenu.id).where(
-                        models.DailyMenu.restaurant_id == restaurant_id,
-                        models.DailyMenu.day == day,
-                    ),
-                }
-                for i in ids
-                for day in days
-            ]
+    """
+    Items that aren't the restaurant's, or are on a day's menu already, are skipped. Returns how
+    many (item, day) pairs were added, or with ``MENU_DAYS_MASK`` how many items changed.
+    """
+    if get_settings().MENU_DAYS_MASK:
+        return _update_days(
+            db,
+            restaurant_id,
+            ids,
+            models.Item.days.bitwise_or(models.Weekdays.mask(days)),
         )
-    ).rowcount
+
+    day = models.MenuItem.day.type
+    added = 0
+    for in_batch in _in_batches(db, models.Item.id, ids):
+        owned = select(models.Item.restaurant_id, models.Item.id).where(
+            models.Item.restaurant_id == restaurant_id, in_batch
+        )
+        added += db.execute(
+            _insert(db, models.MenuItem)
+            .from_select(
+                ["restaurant_id", "item_id", "day"],
+                union_all(*(owned.add_columns(literal(d, day)) for d in days)),
+            )
+            .on_conflict_do_nothing()
+        ).rowcount
+    _menus_changed(db)
+    return added
 
 
 def remove_item_from_daily_menu(
-    db: Session, restaurant_id: int, days: list[models.Weekdays], ids: list[int]
+    db: Session, restaurant_id: int, days: list[models.Weekdays], ids: Collection[int]
 ) -> int:
-    return (
-        db.query(models.AssocItemDailyMenu)
-        .where(
-            models.AssocItemDailyMenu.item_id.in_(
-                db.query(models.AssocItemDailyMenu.item_id)
-                .join(models.Item)
-                .where(models.AssocItemDailyMenu.item_id.in_(ids))
-                .where(models.Item.restaurant_id == restaurant_id)
+    """
+    Returns how many (item, day) pairs were removed, or with ``MENU_DAYS_MASK`` how many items
+    changed.
+    """
+    if get_settings().MENU_DAYS_MASK:
+        keep = models.ALL_DAYS ^ models.Weekdays.mask(days)
+        return _update_days(db, restaurant_id, ids, models.Item.days.bitwise_and(keep))
+
+    removed = 0
+    for in_batch in _in_batches(db, models.MenuItem.item_id, ids):
+        removed += db.execute(
+            delete(models.MenuItem).where(
+                models.MenuItem.restaurant_id == restaurant_id,
+                models.MenuItem.day.in_(days),
+                in_batch,
+            ),
+            execution_options=_UNSYNCHRONIZED,
+        ).rowcount
+    _menus_changed(db)
+    return removed
+
+
+def _update_days(
+    db: Session, restaurant_id: int, ids: Collection[int], days: ColumnElement[int]
+) -> int:
+    """
+    Set the restaurant's items ``ids`` to ``days``, one ``UPDATE`` per batch. Items it leaves as
+    they were aren't written, or counted.
+    """
+    changed = 0
+    for in_batch in _in_batches(db, models.Item.id, ids):
+        changed += db.execute(
+            update(models.Item)
+            .where(
+                models.Item.restaurant_id == restaurant_id,
+                in_batch,
+                models.Item.days != days,
+            )
+            .values(days=days),
+            execution_options=_UNSYNCHRONIZED,
+        ).rowcount
+    _menus_changed(db)
+    return changed
+
+
+def virtualize_daily_menus(db: Session) -> None:
+    """
+    Move menus out of ``items_daily_menus``, keyed by their ``daily_menus`` row, into
+    ``menu_items``, keyed by restaurant and day. Then drop the ``daily_menus`` rows with no title.
+    """
+    if inspect(db.connection()).has_table("items_daily_menus"):
+        db.execute(
+            text(
+                "INSERT INTO menu_items (restaurant_id, day, item_id)"
+                " SELECT m.restaurant_id, m.day, a.item_id"
+                " FROM items_daily_menus a JOIN daily_menus m ON m.id = a.daily_menu_id"
             )
         )
-        .where(
-            models.AssocItemDailyMenu.daily_menu_id.in_(
-                db.query(models.AssocItemDailyMenu.daily_menu_id)
-                .join(models.DailyMenu)
-                .where(models.DailyMenu.day.in_(days)),
+        db.execute(text("DROP TABLE items_daily_menus"))
+    db.execute(delete(models.DailyMenu).where(models.DailyMenu.title.is_(None)))
+    for index in Base.metadata.tables[models.DailyMenu.__tablename__].indexes:
+        index.create(db.connection(), checkfirst=True)
+
+
+MIGRATIONS[6] = virtualize_daily_menus
+
+
+def add_item_days(db: Session) -> None:
+    """
+    Add ``items.days``, and its index, for databases that predate ``MENU_DAYS_MASK``.
+    """
+    columns = inspect(db.connection()).get_columns(models.Item.__tablename__)
+    if "days" not in {c["name"] for c in columns}:
+        db.execute(text("ALTER TABLE items ADD COLUMN days INTEGER NOT NULL DEFAULT 0"))
+    for index in Base.metadata.tables[models.Item.__tablename__].indexes:
+        index.create(db.connection(), checkfirst=True)
+
+
+MIGRATIONS[7] = add_item_days
+
+
+def _menus_to_move(db: Session) -> bool:
+    """
+    Whether any menu is kept elsewhere than where ``MENU_DAYS_MASK`` says.
+    """
+    if get_settings().MENU_DAYS_MASK:
+        return db.scalar(select(models.MenuItem.item_id).limit(1)) is not None
+    return (
+        db.scalar(select(models.Item.id).where(models.Item.days != 0).limit(1))
+        is not None
+    )
+
+
+def sync_menu_storage(db: Session) -> bool:
+    """
+    Should run on startup, after ``migrate``. Moves every menu to where ``MENU_DAYS_MASK`` says
+    they're kept, from where they were kept before it changed, if anywhere. Costs a single
+    query when there's nothing to move. Returns whether anything moved.
+    """
+    if not _menus_to_move(db):
+        return False
+    db.commit()  # Nothing held while waiting for the lock.
+
+    with _migration_lock(db):
+        # Another process may have moved them while this one waited.
+        if not _menus_to_move(db):
+            return False
+        if get_settings().MENU_DAYS_MASK:
+            for day in models.Weekdays:
+                db.execute(
+                    update(models.Item)
+                    .where(
+                        models.Item.id.in_(
+                            select(models.MenuItem.item_id).where(
+                                models.MenuItem.day == day
+                            )
+                        )
+                    )
+                    .values(days=models.Item.days.bitwise_or(day.bit)),
+                    execution_options=_UNSYNCHRONIZED,
+                )
+            db.execute(delete(models.MenuItem), execution_options=_UNSYNCHRONIZED)
+        else:
+            day_type = models.MenuItem.day.type
+            db.execute(
+                insert(models.MenuItem).from_select(
+                    ["restaurant_id", "day", "item_id"],
+                    union_all(
+                        *(
+                            select(
+                                models.Item.restaurant_id,
+                                literal(day, day_type),
+                                models.Item.id,
+                            ).where(models.Item.days.bitwise_and(day.bit) != 0)
+                            for day in models.Weekdays
+                        )
+                    ),
+                )
+            )
+            db.execute(
+                update(models.Item).where(models.Item.days != 0).values(days=0),
+                execution_options=_UNSYNCHRONIZED,
+            )
+        _menus_changed(db)
+        db.commit()
+    logger.info("menus moved", extra={"days_mask": get_settings().MENU_DAYS_MASK})
+    return True
+
+
+_items_fts = table(
+    models.ITEMS_FTS,
+    # Hidden column, named after the table, for FTS5 commands.
+    column(models.ITEMS_FTS),
+    column("rowid"),
+    column("name"),
+    column("description"),
+)
+
+
+_item_search: dict[Engine | Any, bool] = {}
+
+
+def _has_item_search(db: Session) -> bool:
+    """
+    Whether ``items_fts`` exists, it's only created on SQLite builds with FTS5. Looked up once
+    per engine.
+    """
+    bind = db.get_bind()
+    if bind not in _item_search:
+        # Through the session's connection, another one could wait on its write lock.
+        _item_search[bind] = inspect(db.connection()).has_table(models.ITEMS_FTS)
+    return _item_search[bind]
+
+
+def create_item_search(db: Session) -> None:
+    """
+    Create and fill ``items_fts`` for databases that predate it.
+    """
+    if models.has_fts5(db.connection()):
+        db.execute(models.CREATE_ITEMS_FTS)
+        rebuild_item_search(db)
+    _item_search.clear()
+
+
+def rebuild_item_search(db: Session) -> None:
+    """
+    Reindex every item, for when ``items`` was written to behind ``add_items``' back.
+    """
+    if _has_item_search(db):
+        db.execute(insert(_items_fts).values({models.ITEMS_FTS: "rebuild"}))
+
+
+MIGRATIONS[5] = create_item_search
+
+
+def search_items(
+    db: Session,
+    q: str,
+    day: models.Weekdays | None = None,
+    max_price: int | None = None,
+    limit: int = 20,
+) -> Sequence[Row[Any]]:
+    """
+    Items of all restaurants whose name or description has all the words of ``q``, the last one
+    possibly unfinished. Items matching on name alone come before those that need their
+    description. Falls back to substring matching in name order where there's no full-text index.
+    """
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return []
+
+    stmt = select(
+        models.Item.id,
+        models.Item.name,
+        models.Item.price,
+        models.Item.description,
+        models.Item.restaurant_id,
+        models.Restaurant.name.label("restaurant"),
+    ).join(models.Restaurant)
+    if max_price is not None:
+        stmt = stmt.where(models.Item.price <= max_price)
+    if day is not None and get_settings().MENU_DAYS_MASK:
+        stmt = stmt.where(models.Item.days.bitwise_and(day.bit) != 0)
+    elif day is not None:
+        stmt = stmt.where(
+            models.Item.id.in_(
+                select(models.MenuItem.item_id).where(models.MenuItem.day == day)
             )
         )
-        .delete()
+
+    if not _has_item_search(db):
+        return db.execute(
+            stmt.where(
+                *(
+                    or_(
+                        models.Item.name.icontains(t, autoescape=True),
+                        models.Item.description.icontains(t, autoescape=True),
+                    )
+                    for t in terms
+                )
+            )
+            .order_by(models.Item.name)
+            .limit(limit)
+        ).all()
+
+    # Quoted, so no word is taken for an operator.
+    words = " ".join(f'"{t}"' for t in terms) + "*"
+    on_name = f"name : ({words})"
+    stmt = stmt.join(_items_fts, _items_fts.c.rowid == models.Item.id)
+    found: list[Row[Any]] = []
+    # Ranking every match with ``bm25`` costs as much as there are matches, common words match
+    # tens of thousands of items. Each tier instead stops at ``limit``.
+    for match in (on_name, f"({words}) NOT {on_name}"):
+        found += db.execute(
+            stmt.where(literal_column(models.ITEMS_FTS).op("MATCH")(match)).limit(
+                limit - len(found)
+            )
+        ).all()
+        if len(found) == limit:
+            break
+    return found
+
+
+_user_taken = select(models.User.username, models.User.email).where(
+    or_(
+        models.User.username == bindparam("username"),
+        models.User.email == bindparam("email"),
     )
+)
 
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    db_user = models.User(**user.model_dump())
-    db_user.password = auth.get_password_hash(user.password)
+def _taken(db: Session, user: schemas.UserCreate) -> tuple[bool, bool]:
+    """
+    Whether the username, and whether the email, belong to someone already.
+    """
+    rows = db.execute(_user_taken, {"username": user.username, "email": user.email})
+    taken = (False, False)
+    for username, email in rows:
+        taken = (taken[0] or username == user.username, taken[1] or email == user.email)
+    return taken
+
+
+def create_user(
+    db: Session, user: schemas.UserCreate
+) -> tuple[Outcome, models.User | None, tuple[bool, bool]]:
+    """
+    ``CONFLICT`` if the username or email is taken, otherwise ``MISSING_REFERENCE`` if the
+    restaurant doesn't exist. Also whether the username, and whether the email, were taken.
+
+    They're looked up in one query before hashing the password. Only if the insert still skips,
+    for a duplicate that came in meanwhile or a missing restaurant, are they looked up again.
+    """
+    taken = _taken(db, user)
+    if any(taken):
+        return Outcome.CONFLICT, None, taken
 
-    db.add(db_user)
+    values = user.model_dump() | {"password": auth.get_password_hash(user.password)}
+    stmt = _insert(db, models.User)
+    if user.restaurant_id is None:
+        stmt = stmt.values(**values)
+    else:  # Only insert if the restaurant exists, rather than tripping the foreign key.
+        columns = models.User.__table__.c
+        stmt = stmt.from_select(
+            list(values),
+            select(*(literal(v, columns[k].type) for k, v in values.items())).where(
+                select(models.Restaurant.id)
+                .where(models.Restaurant.id == user.restaurant_id)
+                .exists()
+            ),
+        )
+
+    db_user = db.scalar(stmt.on_conflict_do_nothing().returning(models.User))
     db.commit()
-    db.refresh(db_user)
-    return db_user
+    if db_user is not None:
+        return Outcome.CREATED, db_user, taken
+    taken = _taken(db, user)
+    if any(taken) or user.restaurant_id is None:
+        return Outcome.CONFLICT, None, taken
+    return Outcome.MISSING_REFERENCE, None, taken
 
 
 def get_voting_history_of_user(
@@ -206,57 +881,527 @@ def get_voting_history_of_user(
     ).all()
 
 
-def vote(db: Session, user_id: int, restaurant_id: int) -> models.Vote:
-    r = models.Vote(user_id=user_id, restaurant_id=restaurant_id)
-    db.add(r)
+# Per dialect, see ``_insert``.
+_votes: dict[str, ReturningInsert[tuple[int]]] = {}
+
+
+def vote(db: Session, user_id: int, restaurant_id: int) -> Outcome:
+    """
+    ``CONFLICT`` if the user already voted today.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in _votes:
+        _votes[dialect] = (
+            _insert(db, models.Vote)
+            .values(
+                user_id=bindparam("user_id"), restaurant_id=bindparam("restaurant_id")
+            )
+            .on_conflict_do_nothing()
+            .returning(models.Vote.id)
+        )
+    vote_id = db.scalar(
+        _votes[dialect], {"user_id": user_id, "restaurant_id": restaurant_id}
+    )
     db.commit()
-    db.refresh(r)
-    return r
+    return Outcome.CONFLICT if vote_id is None else Outcome.CREATED
 
 
-def _compute_winner(db: Session, of_date: date) -> list[tuple[int, int]]:
-    votes_desc_cte = (
-        db.query(
-            models.Vote.restaurant_id.label("restaurant_id"),
-            count(models.Vote.restaurant_id).label(  # type:ignore[no-untyped-call]
-                "n"
-            ),
+# Candidate sets of the last few voting days, see ``get_candidates``. Handlers run on the
+# threadpool: lookups go without, changes take ``_candidates_lock``.
+_candidates: dict[date, frozenset[int]] = {}
+_candidates_lock = threading.Lock()
+_CANDIDATE_DAYS_CACHED = 7
+
+
+def _cache_candidates(voting_date: date, candidates: frozenset[int]) -> None:
+    with _candidates_lock:
+        _candidates[voting_date] = candidates
+        while len(_candidates) > _CANDIDATE_DAYS_CACHED:
+            del _candidates[min(_candidates)]
+
+
+def compute_candidates(db: Session, voting_date: date) -> frozenset[int]:
+    """
+    Every restaurant, except the ones that won on both of the last two voting days before
+    ``voting_date``, so that nobody wins three days running. Persisted in ``vote_candidates`` and
+    cached, doesn't commit.
+    """
+    last_two = db.scalars(
+        select(models.VoteWinner.voting_date)
+        .where(models.VoteWinner.voting_date < voting_date)
+        .distinct()
+        .order_by(models.VoteWinner.voting_date.desc())
+        .limit(2)
+    ).all()
+    excluded: Sequence[int] = []
+    if len(last_two) == 2:
+        excluded = db.scalars(
+            select(models.VoteWinner.restaurant_id)
+            .where(models.VoteWinner.voting_date.in_(last_two))
+            .group_by(models.VoteWinner.restaurant_id)
+            .having(count() == 2)  # type:ignore[no-untyped-call]
+        ).all()
+
+    candidates = frozenset(
+        db.scalars(
+            select(models.Restaurant.id).where(models.Restaurant.id.not_in(excluded))
         )
-        .where(models.Vote.voting_date == of_date)
-        .group_by(models.Vote.restaurant_id)
-        .order_by(desc(text("n")))
-        .cte("votes_desc")
     )
-    winners = (
-        db.query(votes_desc_cte)
-        .where(votes_desc_cte.c["n"].in_(db.query(votes_desc_cte.c["n"]).limit(1)))
-        .all()
+    db.execute(
+        delete(models.VoteCandidate).where(
+            models.VoteCandidate.voting_date == voting_date
+        )
+    )
+    if candidates:
+        db.execute(
+            insert(models.VoteCandidate),
+            [{"voting_date": voting_date, "restaurant_id": i} for i in candidates],
+        )
+    _cache_candidates(voting_date, candidates)
+    _menus_changed(db)
+    return candidates
+
+
+def get_candidates(db: Session, voting_date: date) -> frozenset[int]:
+    """
+    Restaurants that can be voted for on ``voting_date``: from memory, else from
+    ``vote_candidates``, else computed (and persisted, commits) on the spot. A day without any
+    is cached all the same, so it's computed once per process.
+    """
+    candidates = _candidates.get(voting_date)
+    if candidates is not None:
+        return candidates
+
+    candidates = frozenset(
+        db.scalars(
+            select(models.VoteCandidate.restaurant_id).where(
+                models.VoteCandidate.voting_date == voting_date
+            )
+        )
     )
-    db.bulk_save_objects(
-        [
-            models.VoteWinner(restaurant_id=restaurant_id, votes=count)
-            for restaurant_id, count in winners
-        ]
+    if candidates:
+        _cache_candidates(voting_date, candidates)
+        return candidates
+
+    candidates = compute_candidates(db, voting_date)
+    db.commit()
+    return candidates
+
+
+_is_candidate = select(models.VoteCandidate.restaurant_id).where(
+    models.VoteCandidate.voting_date == bindparam("voting_date"),
+    models.VoteCandidate.restaurant_id == bindparam("restaurant_id"),
+)
+
+
+def is_candidate(db: Session, voting_date: date, restaurant_id: int) -> bool:
+    """
+    Answered from the cached set. Only an id above all of its ones can belong to a restaurant
+    another process onboarded since, just that one is looked up in ``vote_candidates``.
+    """
+    candidates = get_candidates(db, voting_date)
+    if restaurant_id in candidates:
+        return True
+    if restaurant_id <= max(candidates, default=0):
+        return False
+    persisted = {"voting_date": voting_date, "restaurant_id": restaurant_id}
+    if db.scalar(_is_candidate, persisted) is None:
+        return False
+    with _candidates_lock:
+        if voting_date in _candidates:
+            _candidates[voting_date] |= {restaurant_id}
+    return True
+
+
+def _add_candidates(db: Session, restaurant_ids: Collection[int]) -> None:
+    """
+    New restaurants can be voted for right away, on any day whose set is already computed.
+    """
+    today = datetime.now().date()
+    days = db.scalars(
+        select(models.VoteCandidate.voting_date)
+        .where(models.VoteCandidate.voting_date >= today)
+        .distinct()
+    ).all()
+    _insert_rows(
+        db,
+        insert(models.VoteCandidate),
+        [{"voting_date": d, "restaurant_id": i} for d in days for i in restaurant_ids],
+    )
+    with _candidates_lock:
+        for d in [d for d in _candidates if d >= today]:
+            _candidates[d] |= frozenset(restaurant_ids)
+
+
+def get_candidate_restaurants(
+    db: Session, voting_date: date
+) -> Sequence[Row[tuple[int, str]]]:
+    return db.execute(
+        select(models.Restaurant.id, models.Restaurant.name)
+        .where(models.Restaurant.id.in_(get_candidates(db, voting_date)))
+        .order_by(models.Restaurant.id)
+    ).all()
+
+
+def get_today(db: Session, today: date) -> list[schemas.TodayMenu]:
+    """
+    Every candidate restaurant with its menu for ``today``, in one query.
+    """
+    day = models.Weekdays.of(today)
+    stmt = select(
+        models.Restaurant.id,
+        models.Restaurant.name,
+        models.DailyMenu.title,
+        models.Item,
+    ).outerjoin(
+        models.DailyMenu,
+        (models.DailyMenu.restaurant_id == models.Restaurant.id)
+        & (models.DailyMenu.day == day),
+    )
+    if get_settings().MENU_DAYS_MASK:
+        stmt = stmt.outerjoin(
+            models.Item,
+            (models.Item.restaurant_id == models.Restaurant.id)
+            & (models.Item.days.bitwise_and(day.bit) != 0),
+        )
+    else:
+        stmt = stmt.outerjoin(
+            models.MenuItem,
+            (models.MenuItem.restaurant_id == models.Restaurant.id)
+            & (models.MenuItem.day == day),
+        ).outerjoin(models.Item, models.Item.id == models.MenuItem.item_id)
+    rows = db.execute(
+        stmt.where(models.Restaurant.id.in_(get_candidates(db, today))).order_by(
+            models.Restaurant.id, models.Item.id
+        )
+    ).all()
+
+    menus: dict[int, schemas.TodayMenu] = {}
+    for restaurant_id, name, title, item in rows:
+        menu = menus.get(restaurant_id)
+        if menu is None:
+            menu = menus[restaurant_id] = schemas.TodayMenu(
+                restaurant_id=restaurant_id, restaurant=name, title=title, items=[]
+            )
+        if item is not None:
+            menu.items.append(schemas.Item.model_validate(item))
+    return list(menus.values())
+
+
+_today_feed: dict[tuple[date, int], bytes] = {}
+_today_feed_json = TypeAdapter(list[schemas.TodayMenu])
+
+
+def today_feed(db: Session) -> bytes:
+    """
+    ``get_today`` as JSON, rebuilt only once the day or ``shared_menu_generation`` changed,
+    whichever process changed menus or candidates.
+    """
+    # Read before the data it's built from.
+    key = (datetime.now().date(), shared_menu_generation(db))
+    feed = _today_feed.get(key)
+    if feed is None:
+        feed = _today_feed_json.dump_json(get_today(db, key[0]))
+        _today_feed.clear()
+        _today_feed[key] = feed
+    return feed
+
+
+def _compute_winner(
+    db: Session, of_date: date
+) -> tuple[Outcome, list[tuple[int, int]]]:
+    """
+    ``CONFLICT`` if ``of_date`` was already finalized, in which case nothing is written.
+    """
+    totals = db.execute(
+        select(
+            models.Vote.restaurant_id,
+            count(models.Vote.restaurant_id),  # type:ignore[no-untyped-call]
+        )
+        .where(models.Vote.voting_date == of_date)
+        .group_by(models.Vote.restaurant_id)
+    ).all()
+
+    # The day's totals double as the rollup the analytics read from.
+    db.execute(
+        delete(models.VoteDailyTotal).where(
+            models.VoteDailyTotal.voting_date == of_date
+        )
     )
+    if totals:
+        db.execute(
+            insert(models.VoteDailyTotal),
+            [
+                {"voting_date": of_date, "restaurant_id": restaurant_id, "votes": n}
+                for restaurant_id, n in totals
+            ],
+        )
+
+    most = max((n for _, n in totals), default=0)
+    winners = [(restaurant_id, n) for restaurant_id, n in totals if n == most]
+    if winners:
+        inserted = db.scalars(
+            _insert(db, models.VoteWinner)
+            .values(
+                [
+                    {"restaurant_id": restaurant_id, "votes": n, "voting_date": of_date}
+                    for restaurant_id, n in winners
+                ]
+            )
+            .on_conflict_do_nothing()
+            .returning(models.VoteWinner.id)
+        ).all()
+        if len(inserted) < len(winners):  # Finalized before, e.g. the worker ran twice.
+            db.rollback()
+            return Outcome.CONFLICT, winners
     db.commit()
-    return winners
+    logger.info("winners computed", extra={"date": of_date, "winners": winners})
+
+    compute_candidates(db, of_date + timedelta(days=1))
+    db.commit()
+    return Outcome.CREATED, winners
 
 
 def compute_winner(
     session: sessionmaker[Session] | Session = SessionLocal,
-    of_date: date = datetime.now().date(),
-) -> list[tuple[int, int]]:
+    of_date: date | None = None,
+) -> tuple[Outcome, list[tuple[int, int]]]:
+    """
+    ``of_date`` is today by default.
+    """
+    of_date = of_date or datetime.now().date()
     if isinstance(session, Session):
         return _compute_winner(session, of_date)
     with session() as db:
         return _compute_winner(db, of_date)
 
 
-def get_winners(
-    db: Session, voting_day: date = datetime.today().date()
-) -> list[models.VoteWinner]:
+def voting_ends(of_date: date) -> datetime:
+    return datetime.combine(of_date, get_settings().VOTING_ENDS_AT)
+
+
+# The last day this process saw finalized, see ``finalize_winner``.
+_finalized: date | None = None
+_finalize_lock = threading.Lock()
+
+
+_has_winners = (
+    select(models.VoteWinner.id)
+    .where(models.VoteWinner.voting_date == bindparam("voting_date"))
+    .limit(1)
+)
+
+
+def finalize_winner(
+    of_date: date, session: sessionmaker[Session] = SessionLocal
+) -> None:
+    """
+    Compute today's winners, unless voting is still open or they're there already. Covers for the
+    worker, should it be down or late. Concurrent callers wait for the first one. Uses its own
+    session, so whatever the request goes on to do can't commit or roll back a half of it.
+    """
+    global _finalized
+
+    now = datetime.now()
+    if of_date != now.date() or now < voting_ends(of_date) or _finalized == of_date:
+        return
+    with _finalize_lock:
+        if _finalized == of_date:
+            return
+        with session() as db:
+            # Only a read, for every process but the first one there, unless nobody voted.
+            if db.scalar(_has_winners, {"voting_date": of_date}) is None:
+                # ``CONFLICT`` if the worker, or another process, got there meanwhile.
+                _compute_winner(db, of_date)
+        _finalized = of_date
+
+
+_winners_on = select(models.VoteWinner).where(
+    models.VoteWinner.voting_date == bindparam("voting_date")
+)
+
+
+def get_winners(db: Session, voting_day: date | None = None) -> list[models.VoteWinner]:
+    """
+    ``voting_day`` is today by default.
+    """
+    voting_day = voting_day or datetime.now().date()
+    return list(db.scalars(_winners_on, {"voting_date": voting_day}))
+
+
+def _between(
+    column: Mapped[date], start: date | None, end: date | None
+) -> list[ColumnElement[bool]]:
+    bounds = []
+    if start is not None:
+        bounds.append(column >= start)
+    if end is not None:
+        bounds.append(column <= end)
+    return bounds
+
+
+def backfill_vote_daily_totals(
+    db: Session, start: date | None = None, end: date | None = None
+) -> int:
+    """
+    Rebuild ``vote_daily_totals`` from ``votes`` for the days in ``[start, end]``, both open ended
+    by default. Returns the number of rows written.
+    """
+    db.execute(
+        delete(models.VoteDailyTotal).where(
+            *_between(models.VoteDailyTotal.voting_date, start, end)
+        )
+    )
+    n = db.execute(
+        insert(models.VoteDailyTotal).from_select(
+            ["voting_date", "restaurant_id", "votes"],
+            select(
+                models.Vote.voting_date,
+                models.Vote.restaurant_id,
+                count(models.Vote.id),  # type:ignore[no-untyped-call]
+            )
+            .where(*_between(models.Vote.voting_date, start, end))
+            .group_by(models.Vote.voting_date, models.Vote.restaurant_id),
+        )
+    ).rowcount
+    db.commit()
+    return n
+
+
+MIGRATIONS[3] = backfill_vote_daily_totals
+
+
+def index_vote_daily_totals(db: Session) -> None:
+    """
+    Add ``ix_vote_daily_totals_restaurant`` to databases that predate it.
+    """
+    for index in Base.metadata.tables[models.VoteDailyTotal.__tablename__].indexes:
+        index.create(db.connection(), checkfirst=True)
+
+
+MIGRATIONS[9] = index_vote_daily_totals
+
+
+def _period_start(
+    db: Session, d: Mapped[date] | ColumnElement[date], period: schemas.StatsPeriod
+) -> ColumnElement[date]:
+    """
+    The first of the month, or the Sunday, on or before ``d``.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        if period == schemas.StatsPeriod.MONTH:
+            return type_coerce(func.date_trunc("month", d), Date)
+        return type_coerce(d - cast(func.extract("dow", d), Integer), Date)
+    if period == schemas.StatsPeriod.MONTH:
+        return type_coerce(func.date(d, "start of month"), Date)
+    # Back 6 days, then on to the next Sunday, unless it's one already.
+    return type_coerce(func.date(d, "-6 days", "weekday 0"), Date)
+
+
+def get_vote_stats(
+    db: Session,
+    start: date,
+    end: date,
+    period: schemas.StatsPeriod,
+    restaurant_id: int | None = None,
+) -> list[schemas.VoteStats]:
+    """
+    Votes and vote share per restaurant per period, from ``vote_daily_totals``. With
+    ``restaurant_id``, only that restaurant's rows are returned, but shares are still of all votes.
+    Summed up in the database, which only returns the rows asked for.
+    """
+    totals = models.VoteDailyTotal
+    period_start = _period_start(db, totals.voting_date, period).label("period_start")
+    in_range = _between(totals.voting_date, start, end)
+
+    # Summed per day first, there are as many rows as days to find the period of.
+    days = (
+        select(totals.voting_date, func.sum(totals.votes).label("votes"))
+        .where(*in_range)
+        .group_by(totals.voting_date)
+        .subquery()
+    )
+    day_period = _period_start(db, days.c.voting_date, period).label("period_start")
+    of_all = (
+        select(day_period, func.sum(days.c.votes).label("votes"))
+        .group_by(day_period)
+        .subquery()
+    )
+    stmt = select(
+        period_start, totals.restaurant_id, func.sum(totals.votes).label("votes")
+    )
+    if restaurant_id is not None:
+        stmt = stmt.where(totals.restaurant_id == restaurant_id)
+    per_restaurant = (
+        stmt.where(*in_range).group_by(period_start, totals.restaurant_id).subquery()
+    )
+
+    rows = db.execute(
+        select(
+            per_restaurant.c.period_start,
+            per_restaurant.c.restaurant_id,
+            models.Restaurant.name,
+            per_restaurant.c.votes,
+            of_all.c.votes,
+        )
+        .join(of_all, of_all.c.period_start == per_restaurant.c.period_start)
+        .join(models.Restaurant, models.Restaurant.id == per_restaurant.c.restaurant_id)
+        .order_by(per_restaurant.c.period_start, per_restaurant.c.restaurant_id)
+    ).all()
+    return [
+        schemas.VoteStats(
+            period_start=p,
+            restaurant_id=r_id,
+            restaurant=name,
+            votes=n,
+            share=n / total,
+        )
+        for p, r_id, name, n, total in rows
+    ]
+
+
+def votes_export_query(start: date | None, end: date | None) -> Select[Any]:
     return (
-        db.query(models.VoteWinner)
-        .where(models.VoteWinner.voting_date == voting_day)
-        .all()
+        select(
+            models.Vote.id,
+            models.Vote.user_id,
+            models.User.username,
+            models.Vote.restaurant_id,
+            models.Restaurant.name.label("restaurant"),
+            models.Vote.voting_date,
+            models.Vote.created_at,
+        )
+        .join(models.User, models.User.id == models.Vote.user_id)
+        .join(models.Restaurant, models.Restaurant.id == models.Vote.restaurant_id)
+        .where(*_between(models.Vote.voting_date, start, end))
+        .order_by(models.Vote.voting_date, models.Vote.id)
+    )
+
+
+def winners_export_query(start: date | None, end: date | None) -> Select[Any]:
+    return (
+        select(
+            models.VoteWinner.id,
+            models.VoteWinner.restaurant_id,
+            models.Restaurant.name.label("restaurant"),
+            models.VoteWinner.votes,
+            models.VoteWinner.voting_date,
+            models.VoteWinner.created_at,
+        )
+        .join(models.Restaurant)
+        .where(*_between(models.VoteWinner.voting_date, start, end))
+        .order_by(models.VoteWinner.voting_date, models.VoteWinner.id)
     )
+
+
+def stream(
+    stmt: Select[Any],
+    chunk_size: int = 1000,
+    session: sessionmaker[Session] = SessionLocal,
+) -> Iterator[Sequence[Row[Any]]]:
+    """
+    Yield the rows of ``stmt`` ``chunk_size`` at a time, off a server-side cursor where the
+    driver has one. Uses its own session, so it can outlive the request's.
+    """
+    with session() as db:
+        yield from db.execute(stmt.execution_options(yield_per=chunk_size)).partitions()
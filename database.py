@@ -1,5 +1,6 @@
 from collections.abc import Generator
 from sqlite3 import Connection as SqliteConnection
+from typing import Any
 
 from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
@@ -7,9 +8,16 @@ from sqlalchemy.engine.interfaces import DBAPIConnection
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import ConnectionPoolEntry
 
+import log
+import profiler
 from config import get_settings
 
-engine = create_engine(get_settings().SQLALCHEMY_DATABASE_URL)
+engine = create_engine(
+    get_settings().SQLALCHEMY_DATABASE_URL,
+    pool_size=get_settings().DB_POOL_SIZE,
+    max_overflow=get_settings().DB_MAX_OVERFLOW,
+    pool_timeout=get_settings().DB_POOL_TIMEOUT,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -20,11 +28,24 @@ def set_sqlite_pragma(
     if isinstance(dbapi_connection, SqliteConnection):
         cursor = dbapi_connection.cursor()
         cursor.execute("PRAGMA foreign_keys=ON")
+        # Only takes effect on a new database, see ``maintenance``.
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
         cursor.close()
 
 
+@event.listens_for(Engine, "before_cursor_execute")
+def attach_to_profile(*_: Any) -> None:
+    profiler.attach()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_query(*_: Any) -> None:
+    log.count_query()
+
+
 # Dependency function for db parameter to handler functions.
 def get_db() -> Generator[Session, None, None]:
+    profiler.attach()
     with SessionLocal() as session:
         yield session
         session.commit()
@@ -0,0 +1,50 @@
+"""
+Incremental CSV and JSON Lines encoding for the admin exports. Rows are encoded a chunk at a
+time, so memory stays flat whatever the size of the export.
+"""
+
+import csv
+import io
+import json
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import date, datetime
+from typing import Any
+
+from sqlalchemy import Row
+
+from schemas import ExportFormat
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.JSONL: "application/x-ndjson",
+}
+
+
+def _json_default(o: object) -> str:
+    if isinstance(o, (date, datetime)):
+        return o.isoformat()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+def encode(
+    columns: Sequence[str],
+    chunks: Iterable[Sequence[Row[Any]]],
+    fmt: ExportFormat,
+) -> Iterator[bytes]:
+    if fmt == ExportFormat.CSV:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():  # Just the header, there were no rows.
+            yield buf.getvalue().encode()
+    else:
+        for chunk in chunks:
+            yield "".join(
+                json.dumps(dict(zip(columns, row)), default=_json_default) + "\n"
+                for row in chunk
+            ).encode()
@@ -0,0 +1,222 @@
+"""
+Structured, non-blocking logging.
+
+``setup`` routes the root logger through a ``QueueHandler``: callers only enqueue the record,
+a ``QueueListener`` thread formats it as one JSON line and writes it out. The queue is bounded
+at ``LOG_QUEUE_SIZE``. Past ``LOG_OVERLOAD_THRESHOLD`` of it, records below ``WARNING`` are kept
+at ``LOG_OVERLOAD_SAMPLE_RATE`` only, and once it's full anything else is dropped. Both are
+counted and reported by the writer when it catches up.
+
+``RequestLoggingMiddleware`` keeps a ``RequestContext`` per request, records logged while it's
+handled carry its route, method and user id, and it logs one access record when it's done.
+"""
+
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, TextIO
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# ``LogRecord`` attributes, anything else on a record came in through ``extra``.
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "context"}
+
+
+class RequestContext:
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.route = path  # Until routing replaces it with the route's template.
+        self.user_id: int | None = None
+        self.queries = 0
+        self.started = time.perf_counter()
+
+    def fields(self) -> dict[str, Any]:
+        return {"method": self.method, "route": self.route, "user_id": self.user_id}
+
+
+# Threadpool threads get a copy of the context, but it refers to the same ``RequestContext``.
+_request: ContextVar[RequestContext | None] = ContextVar("request", default=None)
+
+
+def set_user(user_id: int) -> None:
+    ctx = _request.get()
+    if ctx is not None:
+        ctx.user_id = user_id
+
+
+def count_query() -> None:
+    ctx = _request.get()
+    if ctx is not None:
+        ctx.queries += 1
+
+
+_lost = {"dropped": 0, "sampled_out": 0}
+_lost_lock = threading.Lock()
+
+
+def _lose(reason: str) -> None:
+    with _lost_lock:
+        _lost[reason] += 1
+
+
+def stats() -> dict[str, int]:
+    """
+    Records lost to overload since startup.
+    """
+    with _lost_lock:
+        return dict(_lost)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+        entry.update(
+            (k, v) for k, v in record.__dict__.items() if k not in _RECORD_ATTRS
+        )
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Enqueues records as they are, formatting is left to the listener thread.
+    """
+
+    queue: queue.Queue[logging.LogRecord]
+
+    def emit(self, record: logging.LogRecord) -> None:
+        settings = get_settings()
+        if (
+            record.levelno < logging.WARNING
+            and self.queue.qsize()
+            >= self.queue.maxsize * settings.LOG_OVERLOAD_THRESHOLD
+            and random.random() >= settings.LOG_OVERLOAD_SAMPLE_RATE
+        ):
+            _lose("sampled_out")
+            return
+
+        ctx = _request.get()
+        record.context = ctx.fields() if ctx is not None else None
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _lose("dropped")
+
+
+class _Writer(logging.StreamHandler):  # type: ignore[type-arg]
+    """
+    Runs on the listener thread, and reports lost records along with the next one written.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        super().__init__(stream)
+        self.setFormatter(JsonFormatter())
+        self.reported = stats()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        current = stats()
+        if current != self.reported:
+            lost = {k: current[k] - self.reported[k] for k in current}
+            self.reported = current
+            super().emit(
+                logging.makeLogRecord(
+                    {
+                        "name": __name__,
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                        "msg": "log records lost to overload",
+                        **lost,
+                    }
+                )
+            )
+        super().emit(record)
+
+
+_listener: QueueListener | None = None
+_handler: BoundedQueueHandler | None = None
+
+
+def setup(stream: TextIO = sys.stdout) -> None:
+    """
+    Route the root logger through the queue, until ``shutdown``. Does nothing if already set up.
+    """
+    global _listener, _handler
+
+    if _listener is not None:
+        return
+
+    settings = get_settings()
+    q: queue.Queue[logging.LogRecord] = queue.Queue(settings.LOG_QUEUE_SIZE)
+    _listener = QueueListener(q, _Writer(stream))
+    _listener.start()
+    _handler = BoundedQueueHandler(q)
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+
+def shutdown() -> None:
+    """
+    Write out what's still queued and stop the listener thread.
+    """
+    global _listener, _handler
+
+    if _listener is None or _handler is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    _listener = _handler = None
+
+
+class RequestLoggingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ctx = RequestContext(scope["method"], scope["path"])
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _request.set(ctx)
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            if "route" in scope:  # Set by the router once it matched.
+                ctx.route = scope["route"].path
+            logger.info(
+                "request",
+                extra={
+                    "status": status,
+                    "latency_ms": round((time.perf_counter() - ctx.started) * 1000, 3),
+                    "queries": ctx.queries,
+                },
+            )
+            _request.reset(token)
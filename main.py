@@ -1,33 +1,90 @@
-from collections.abc import AsyncGenerator, Callable, Generator
+import logging
+from collections.abc import AsyncGenerator, Callable, Generator, Sequence
 from contextlib import asynccontextmanager
 from datetime import date, datetime
-from typing import Annotated
+from typing import Annotated, Any
 
-from fastapi import Depends, FastAPI, HTTPException, status
+import sqlalchemy.exc
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import (HTTPAuthorizationCredentials, HTTPBearer,
                               OAuth2PasswordRequestForm)
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import Select
 from sqlalchemy.orm import Session
+from starlette.types import Receive, Scope, Send
 
+import admission
 import auth
+import catalog
 import crud
+import export
+import log
 import models
+import profiler
+import ratelimit
 import schemas
+import singleflight
 from config import get_settings
-from database import get_db
+from database import SessionLocal, get_db
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
     """
-    Creates root user on startup.
+    Brings the schema up to date and calibrates bcrypt on startup. The root user is created
+    once, by ``python manage.py create-root-user``.
     """
-    crud.create_root_user(next(get_db()))
+    log.setup()
+    admission.setup()
+    with SessionLocal() as db:
+        crud.migrate(db)
+        crud.sync_menu_storage(db)
+        crud.today_feed(db)  # Warm, it's the first thing everyone asks for.
+        generation = crud.shared_menu_generation(db)
+    # Only if it's missing, or older than the database, e.g. another worker just built it.
+    catalog.publish(generation)
+    auth.get_pwd_context()
     yield
+    log.shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(admission.AdmissionMiddleware, streaming=("/export/",))
+app.add_middleware(profiler.ProfilingMiddleware)
+app.add_middleware(log.RequestLoggingMiddleware)
 security = HTTPBearer()
+logger = logging.getLogger(__name__)
+
+menus = singleflight.Group[list[schemas.Item]]("menus")
+weeks = singleflight.Group[schemas.WeekMenu]("weeks")
+winners = singleflight.Group[list[schemas.VoteWinner]]("winners")
+histories = singleflight.Group[list[schemas.EmployeeVoteHistory]]("histories")
+
+login_limits = {
+    "username": ratelimit.SlidingWindow(
+        get_settings().LOGIN_ATTEMPTS_PER_USERNAME,
+        get_settings().LOGIN_WINDOW_SECONDS,
+        get_settings().LOGIN_LIMIT_MAX_KEYS,
+    ),
+    "ip": ratelimit.SlidingWindow(
+        get_settings().LOGIN_ATTEMPTS_PER_IP,
+        get_settings().LOGIN_WINDOW_SECONDS,
+        get_settings().LOGIN_LIMIT_MAX_KEYS,
+    ),
+}
+
+
+@app.exception_handler(sqlalchemy.exc.TimeoutError)
+async def pool_exhausted(_: Request, __: sqlalchemy.exc.TimeoutError) -> JSONResponse:
+    """
+    No connection came free within ``DB_POOL_TIMEOUT``.
+    """
+    logger.warning("connection pool exhausted")
+    return JSONResponse(
+        {"detail": "The server is busy, try again shortly"},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
 
 
 def filter_by_role(role: models.Roles) -> Callable[..., None]:
@@ -70,21 +127,76 @@ def get_restaurant_id(
     yield auth.unpack_jwt(creds.credentials).restaurant_id
 
 
+def token_for(user: models.User, refresh_token: str) -> auth.Token:
+    token = auth.create_access_token(
+        user.id, str(user.username), models.Roles(str(user.role)), user.restaurant_id
+    )
+    token.refresh_token = refresh_token
+    return token
+
+
 # TODO: Logout (use a nonce in jwt?)
 @app.post("/login", response_model=auth.Token)
 def login_access_token(
-    db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
+    request: Request,
+    db: Session = Depends(get_db),
+    form_data: OAuth2PasswordRequestForm = Depends(),
 ) -> auth.Token:
+    # Checked before anything is looked up or hashed, it's bcrypt that's being protected. Only
+    # attempts both limits let through count against either.
+    keys = [
+        ("ip", request.client.host if request.client else None),
+        ("username", form_data.username[: get_settings().USERNAME_MAX_LENGTH]),
+    ]
+    refused = ratelimit.hit_all([(login_limits[limit], key) for limit, key in keys])
+    if refused is not None:
+        i, retry_after = refused
+        limit, key = keys[i]
+        logger.info("login throttled", extra={"limit": limit, "key": key})
+        raise HTTPException(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
     user = crud.get_user(db, username=form_data.username)
-    if user is None or not auth.verify_password(form_data.password, user.password):
+    verified, new_hash = False, None
+    if user is not None:
+        verified, new_hash = auth.verify_and_update_password(
+            form_data.password, user.password
+        )
+    if user is None or not verified:
+        logger.warning("login failed", extra={"username": form_data.username})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
+    if new_hash is not None:  # Stored with an outdated cost, committed by ``get_db``.
+        crud.set_password_hash(db, user, new_hash)
 
-    return auth.create_access_token(
-        user.id, str(user.username), models.Roles(str(user.role)), user.restaurant_id
+    refresh_token, token_hash, expires_at = auth.new_refresh_token()
+    crud.create_refresh_token(db, user.id, token_hash, expires_at)
+    return token_for(user, refresh_token)
+
+
+@app.post("/token/refresh", response_model=auth.Token)
+def refresh_access_token(
+    body: auth.RefreshTokenRequest, db: Session = Depends(get_db)
+) -> auth.Token:
+    """
+    Trade a refresh token for a new access token and a new refresh token, no password check.
+    """
+    refresh_token, token_hash, expires_at = auth.new_refresh_token()
+    user = crud.rotate_refresh_token(
+        db, auth.hash_refresh_token(body.refresh_token), token_hash, expires_at
     )
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+        )
+
+    return token_for(user, refresh_token)
 
 
 @app.post(
@@ -94,23 +206,19 @@ def login_access_token(
     dependencies=[Depends(admin_only)],
 )
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)) -> models.User:
-    u, e = crud.is_email_username_registered(
-        db, username=user.username, email=user.email
-    )
-    d = []
-    if u is True:
-        d.append("Username")
-    if e is True:
-        d.append("Email")
-    if u or e:
+    outcome, new_user, (u, e) = crud.create_user(db=db, user=user)
+    if outcome == crud.Outcome.MISSING_REFERENCE:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Restaurant does not exist.")
+    if new_user is None:
+        d = []
+        if u:
+            d.append("Username")
+        if e:
+            d.append("Email")
         raise HTTPException(
             status_code=409, detail=f"{' and '.join(d)} already registered"
         )
-    try:
-        new_user = crud.create_user(db=db, user=user)
-        return new_user
-    except IntegrityError:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Restaurant does not exist.")
+    return new_user
 
 
 @app.post(
@@ -121,19 +229,56 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)) -> mode
 )
 def create_restaurant(
     restaurant: schemas.RestaurantCreate, db: Session = Depends(get_db)
-) -> models.Restaurant | None:
-    try:
-        return crud.create_restaurant(db, restaurant)
-    except IntegrityError as e:
-        if (
-            e.orig is not None
-            and isinstance(e.orig.args[0], str)
-            and e.orig.args[0].lower().count("unique")
-        ):
-            raise HTTPException(
-                status.HTTP_409_CONFLICT, "Restaurant with this name already exists."
-            )
-        raise e
+) -> models.Restaurant:
+    _, r = crud.create_restaurant(db, restaurant)
+    if r is None:
+        raise HTTPException(
+            status.HTTP_409_CONFLICT, "Restaurant with this name already exists."
+        )
+    return r
+
+
+@app.post(
+    "/restaurants/bulk",
+    response_model=list[schemas.RestaurantBulkResult],
+    dependencies=[Depends(admin_only)],
+)
+def create_restaurants(
+    bulk: schemas.RestaurantsCreateBulk, db: Session = Depends(get_db)
+) -> list[schemas.RestaurantBulkResult]:
+    """
+    Create many restaurants at once. Those whose name is taken are skipped, with no id.
+    """
+    return [
+        schemas.RestaurantBulkResult(name=r.name, id=i)
+        for r, (_, i) in zip(
+            bulk.restaurants, crud.create_restaurants(db, bulk.restaurants)
+        )
+    ]
+
+
+class MappedResponse(Response):
+    """
+    JSON from a view of ``catalog``'s mapping, sent as it is where ``Response`` would want a copy
+    of it in ``bytes``.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, view: memoryview) -> None:
+        super().__init__()
+        self.view = view
+        self.headers["content-length"] = str(len(view))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": self.view})
 
 
 @app.get(
@@ -147,8 +292,55 @@ def get_menu(
     restaurant_id: int = Depends(get_restaurant_id),
     db: Session = Depends(get_db),
     all: bool = False,
-) -> models.DailyMenu | list[models.Item]:
-    return crud.get_items(db, restaurant_id, day, all)
+) -> Response | list[schemas.Item]:
+    cached = catalog.menu(restaurant_id, day, all)
+    if cached is not None:
+        return MappedResponse(cached)
+    return menus.do(
+        (restaurant_id, day, all, crud.menu_generation()),
+        lambda: [
+            schemas.Item.model_validate(i)
+            for i in crud.get_items(db, restaurant_id, day, all)
+        ],
+    )
+
+
+@app.get(
+    "/menu/week",
+    response_model=schemas.WeekMenu,
+    dependencies=[Depends(restaurateur_only)],
+)
+def get_week_menu(
+    restaurant_id: int = Depends(get_restaurant_id),
+    db: Session = Depends(get_db),
+) -> schemas.WeekMenu:
+    """
+    Every item, once, with the ids of those on each day's menu: what ``GET /menu/`` gives for
+    each day and with ``all``, in one go.
+    """
+    return weeks.do(
+        (restaurant_id, crud.menu_generation()),
+        lambda: crud.get_week(db, restaurant_id),
+    )
+
+
+@app.get(
+    "/menu/search",
+    response_model=list[schemas.ItemSearchResult],
+    dependencies=[Depends(employee_only)],
+)
+def search_menu(
+    q: str = Query(min_length=1, max_length=100),
+    day: models.Weekdays | None = None,
+    max_price: int | None = Query(default=None, gt=0),
+    limit: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(get_db),
+) -> Sequence[Any]:
+    """
+    Items from every restaurant matching ``q``, optionally served on ``day`` and at most
+    ``max_price``.
+    """
+    return crud.search_items(db, q, day, max_price, limit)
 
 
 @app.post(
@@ -184,6 +376,18 @@ def patch_menu(
         crud.delete_items(db, restaurant_id, patch.ids)
 
 
+@app.get(
+    "/today",
+    response_model=list[schemas.TodayMenu],
+    dependencies=[Depends(employee_only)],
+)
+def get_today(db: Session = Depends(get_db)) -> Response:
+    """
+    What every restaurant that can be voted for today is serving.
+    """
+    return Response(crud.today_feed(db), media_type="application/json")
+
+
 @app.get(
     "/vote",
     status_code=status.HTTP_200_OK,
@@ -193,10 +397,13 @@ def get_votes(
     employee_id: int = Depends(get_user_id),
     db: Session = Depends(get_db),
 ) -> list[schemas.EmployeeVoteHistory]:
-    return [
-        schemas.EmployeeVoteHistory(restaurant=r[0], voted_at=r[1])
-        for r in crud.get_voting_history_of_user(db, employee_id)
-    ]
+    return histories.do(
+        employee_id,
+        lambda: [
+            schemas.EmployeeVoteHistory(restaurant=r[0], voted_at=r[1])
+            for r in crud.get_voting_history_of_user(db, employee_id)
+        ],
+    )
 
 
 @app.get(
@@ -206,14 +413,35 @@ def get_votes(
     dependencies=[Depends(employee_only)],
 )
 def get_winners(
-    of_day: date = datetime.today().date(),
+    of_day: date | None = None,
     db: Session = Depends(get_db),
 ) -> list[schemas.VoteWinner]:
+    """
+    Today's by default. The first read after voting ends computes them if the worker hasn't.
+    """
+    of_day = of_day or datetime.now().date()
+    crud.finalize_winner(of_day)
+    return winners.do(
+        of_day,
+        lambda: [
+            schemas.VoteWinner(
+                votes=i.votes, voting_date=i.voting_date, restaurant=i.restaurant.name
+            )
+            for i in crud.get_winners(db, of_day)
+        ],
+    )
+
+
+@app.get(
+    "/vote/candidates",
+    status_code=status.HTTP_200_OK,
+    response_model=list[schemas.Candidate],
+    dependencies=[Depends(employee_only)],
+)
+def get_candidates(db: Session = Depends(get_db)) -> list[schemas.Candidate]:
     return [
-        schemas.VoteWinner(
-            votes=i.votes, voting_date=i.voting_date, restaurant=i.restaurant.name
-        )
-        for i in crud.get_winners(db, of_day)
+        schemas.Candidate(id=i, name=name)
+        for i, name in crud.get_candidate_restaurants(db, datetime.now().date())
     ]
 
 
@@ -235,16 +463,96 @@ def vote(
             status.HTTP_403_FORBIDDEN, "Voting time has ended, try again tomorrow."
         )
 
-    try:
-        crud.vote(db, employee_id, restaurant_id)
-    except IntegrityError as e:
-        if e.orig is not None and isinstance(e.orig.args[0], str):
-            err = e.orig.args[0].lower()
-            if err.count("foreign key"):
-                raise HTTPException(status.HTTP_404_NOT_FOUND, "No such restaurant.")
-            elif err.count("unique"):
-                raise HTTPException(
-                    status.HTTP_409_CONFLICT, "You can vote only once per day."
-                )
-            else:
-                raise e
+    if not crud.is_candidate(db, datetime.now().date(), restaurant_id):
+        if crud.get_restaurant(db, restaurant_id) is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "No such restaurant.")
+        raise HTTPException(
+            status.HTTP_403_FORBIDDEN,
+            "This restaurant won the last two days, it can't win three in a row.",
+        )
+
+    if crud.vote(db, employee_id, restaurant_id) == crud.Outcome.CONFLICT:
+        raise HTTPException(status.HTTP_409_CONFLICT, "You can vote only once per day.")
+
+
+@app.get(
+    "/stats/votes",
+    status_code=status.HTTP_200_OK,
+    response_model=list[schemas.VoteStats],
+)
+def get_vote_stats(
+    start: date = Query(alias="from"),
+    end: date = Query(alias="to"),
+    group: schemas.StatsPeriod = schemas.StatsPeriod.WEEK,
+    role: models.Roles = Depends(get_role),
+    restaurant_id: int | None = Depends(get_restaurant_id),
+    db: Session = Depends(get_db),
+) -> list[schemas.VoteStats]:
+    """
+    Admins see every restaurant, restaurateurs only their own.
+    """
+    if role == models.Roles.EMPLOYEE:
+        raise HTTPException(
+            status.HTTP_403_FORBIDDEN,
+            detail="Only an admin or a restaurateur can use this feature",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if role == models.Roles.ADMIN:
+        restaurant_id = None
+    return crud.get_vote_stats(db, start, end, group, restaurant_id)
+
+
+@app.get(
+    "/metrics",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(admin_only)],
+)
+def get_metrics() -> dict[str, Any]:
+    """
+    Reads collapsed into another request's fetch, per key, login attempts let through and
+    refused, requests admitted and turned away for load, and log records lost to overload.
+    """
+    return {
+        "singleflight": singleflight.stats(),
+        "login_limits": {k: v.stats() for k, v in login_limits.items()},
+        "admission": admission.stats(),
+        "log": log.stats(),
+    }
+
+
+def export_response(
+    name: str, stmt: Select[Any], fmt: schemas.ExportFormat
+) -> StreamingResponse:
+    return StreamingResponse(
+        export.encode([c.name for c in stmt.selected_columns], crud.stream(stmt), fmt),
+        media_type=export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@app.get(
+    "/export/votes",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    dependencies=[Depends(admin_only)],
+)
+def export_votes(
+    start: date | None = Query(None, alias="from"),
+    end: date | None = Query(None, alias="to"),
+    format: schemas.ExportFormat = schemas.ExportFormat.CSV,
+) -> StreamingResponse:
+    return export_response("votes", crud.votes_export_query(start, end), format)
+
+
+@app.get(
+    "/export/winners",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    dependencies=[Depends(admin_only)],
+)
+def export_winners(
+    start: date | None = Query(None, alias="from"),
+    end: date | None = Query(None, alias="to"),
+    format: schemas.ExportFormat = schemas.ExportFormat.CSV,
+) -> StreamingResponse:
+    return export_response("winners", crud.winners_export_query(start, end), format)
@@ -0,0 +1,95 @@
+"""
+Routine upkeep of the database, run by the ``maintain_database`` task every afternoon at
+``MAINTENANCE_AT``, or by ``python manage.py maintenance``.
+
+Expired refresh tokens are deleted first. On SQLite, the rest goes in short steps, each its own
+transaction, so the write lock is only ever held for a moment and requests keep going meanwhile:
+
+- ``ANALYZE``, sampling at most ``MAINTENANCE_ANALYSIS_LIMIT`` rows per index, then
+  ``PRAGMA optimize`` refresh the query planner's statistics,
+- a passive WAL checkpoint copies what it can into the database without waiting on readers,
+- ``incremental_vacuum`` hands free pages back to the filesystem, ``MAINTENANCE_VACUUM_PAGES`` at
+  a time, until none are left or ``MAINTENANCE_BUDGET_SECONDS`` are up. What's left is freed the
+  next day.
+
+Pages are only handed back by databases created with ``auto_vacuum=INCREMENTAL``, which the
+connect pragma in ``database`` sets for new ones. An older database is converted by a full
+``VACUUM``, ``python manage.py maintenance --vacuum``, which rewrites the whole file holding the
+write lock throughout, so it's never scheduled.
+"""
+
+import logging
+import time
+from typing import NamedTuple
+
+from sqlalchemy import Connection, Engine
+from sqlalchemy.orm import Session
+
+import crud
+import database
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_INCREMENTAL = 2  # ``PRAGMA auto_vacuum``'s value for INCREMENTAL.
+
+
+class Report(NamedTuple):
+    seconds: float
+    reclaimed_bytes: int
+    free_bytes_left: int
+    refresh_tokens_purged: int
+
+
+def _pragma(connection: Connection, name: str) -> int:
+    return connection.exec_driver_sql(f"PRAGMA {name}").scalar_one()  # type: ignore[no-any-return]
+
+
+def _incremental_vacuum(connection: Connection, pages: int) -> None:
+    # Executed as a statement, it frees one page per step and the driver only steps it once.
+    cursor = connection.connection.dbapi_connection.cursor()  # type: ignore[union-attr]
+    try:
+        cursor.executescript(f"PRAGMA incremental_vacuum({pages})")
+    finally:
+        cursor.close()
+
+
+def run(engine: Engine = database.engine, vacuum: bool = False) -> Report:
+    """
+    Do the upkeep, with a full ``VACUUM`` in place of the incremental one if ``vacuum``.
+    """
+    settings = get_settings()
+    started = time.perf_counter()
+    with Session(engine) as db:
+        purged = crud.purge_refresh_tokens(db)
+
+    reclaimed = left = 0
+    if engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as c:
+            c.exec_driver_sql(
+                f"PRAGMA analysis_limit={settings.MAINTENANCE_ANALYSIS_LIMIT}"
+            )
+            c.exec_driver_sql("ANALYZE")
+            c.exec_driver_sql("PRAGMA optimize")
+            c.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+
+            page_size = _pragma(c, "page_size")
+            pages = _pragma(c, "page_count")
+            if vacuum:
+                c.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+                c.exec_driver_sql("VACUUM")
+            elif _pragma(c, "auto_vacuum") == _INCREMENTAL:
+                deadline = started + settings.MAINTENANCE_BUDGET_SECONDS
+                while _pragma(c, "freelist_count") and time.perf_counter() < deadline:
+                    _incremental_vacuum(c, settings.MAINTENANCE_VACUUM_PAGES)
+            reclaimed = (pages - _pragma(c, "page_count")) * page_size
+            left = _pragma(c, "freelist_count") * page_size
+
+    report = Report(
+        seconds=round(time.perf_counter() - started, 3),
+        reclaimed_bytes=reclaimed,
+        free_bytes_left=left,
+        refresh_tokens_purged=purged,
+    )
+    logger.info("maintenance done", extra=report._asdict())
+    return report
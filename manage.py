@@ -0,0 +1,101 @@
+"""
+One-off administrative commands, e.g. ``python manage.py create-root-user``.
+"""
+
+import argparse
+from datetime import date
+from pathlib import Path
+
+import crud
+import maintenance
+from database import SessionLocal
+
+
+def migrate(_: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        if crud.migrate(db):
+            print("schema upgraded")
+        else:
+            print("schema is up to date")
+        if crud.sync_menu_storage(db):
+            print("menus moved to where MENU_DAYS_MASK says")
+
+
+def create_root_user(_: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        crud.migrate(db)
+        if crud.create_root_user(db):
+            print("root user created")
+        else:
+            print("an admin already exists, nothing to do")
+
+
+def backfill_vote_totals(args: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        n = crud.backfill_vote_daily_totals(db, args.start, args.end)
+        print(f"{n} daily totals written")
+
+
+def export_columnar(args: argparse.Namespace) -> None:
+    import columnar  # Pulls in NumPy, keep it out of the other commands.
+
+    with SessionLocal() as db:
+        snapshot = columnar.export(db, args.directory, args.chunk_size)
+    print(
+        f"{len(snapshot.votes.day)} votes and {len(snapshot.winners.day)} winners"
+        f" exported to {args.directory}"
+    )
+
+
+def maintain(args: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        crud.migrate(db)
+    report = maintenance.run(vacuum=args.vacuum)
+    print(
+        f"{report.refresh_tokens_purged} expired refresh tokens purged,"
+        f" {report.reclaimed_bytes} bytes reclaimed, {report.free_bytes_left} left free,"
+        f" in {report.seconds}s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(required=True)
+
+    commands.add_parser("migrate", help="create or upgrade the tables").set_defaults(
+        func=migrate
+    )
+    commands.add_parser(
+        "create-root-user", help="create the root admin, unless an admin exists"
+    ).set_defaults(func=create_root_user)
+
+    backfill = commands.add_parser(
+        "backfill-vote-totals", help="rebuild vote_daily_totals from votes"
+    )
+    backfill.add_argument("--from", dest="start", type=date.fromisoformat)
+    backfill.add_argument("--to", dest="end", type=date.fromisoformat)
+    backfill.set_defaults(func=backfill_vote_totals)
+
+    export = commands.add_parser(
+        "export-columnar", help="snapshot votes and winners into .npy columns"
+    )
+    export.add_argument("directory", type=Path)
+    export.add_argument("--chunk-size", type=int, default=100_000)
+    export.set_defaults(func=export_columnar)
+
+    maintain_parser = commands.add_parser(
+        "maintenance", help="what the daily maintenance task does, on demand"
+    )
+    maintain_parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="full VACUUM instead, locks the database until it's done",
+    )
+    maintain_parser.set_defaults(func=maintain)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,18 @@
 import enum
+from collections.abc import Iterable
 from datetime import date, datetime
+from typing import Any
 
-from sqlalchemy import VARCHAR, ForeignKey, UniqueConstraint
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import (VARCHAR, Connection, ForeignKey, Index, Table,
+                        UniqueConstraint, and_, event, text)
+from sqlalchemy.orm import (DeclarativeBase, Mapped, foreign, mapped_column,
+                            relationship)
 from sqlalchemy.sql.functions import current_date, now
 
+# Bump this, and add an upgrade step to ``crud.MIGRATIONS`` if the new layout needs one,
+# whenever the tables change.
+SCHEMA_VERSION = 9
+
 
 class Base(DeclarativeBase):
     pass
@@ -19,6 +27,40 @@ class Weekdays(enum.StrEnum):
     THURSDAY = enum.auto()
     FRIDAY = enum.auto()
 
+    @classmethod
+    def of(cls, d: date) -> "Weekdays":
+        return _BY_WEEKDAY[d.weekday()]
+
+    @property
+    def bit(self) -> int:
+        """
+        Its bit in ``Item.days``.
+        """
+        return _BITS[self]
+
+    @classmethod
+    def mask(cls, days: Iterable["Weekdays"]) -> int:
+        return sum({_BITS[d] for d in days})
+
+    @classmethod
+    def in_mask(cls, mask: int) -> list["Weekdays"]:
+        return [d for d in cls if mask & _BITS[d]]
+
+
+# In ``date.weekday`` order.
+_BY_WEEKDAY = (
+    Weekdays.MONDAY,
+    Weekdays.TUESDAY,
+    Weekdays.WEDNESDAY,
+    Weekdays.THURSDAY,
+    Weekdays.FRIDAY,
+    Weekdays.SATURDAY,
+    Weekdays.SUNDAY,
+)
+# In ``Weekdays`` order. They're stored, so its members mustn't be reordered.
+_BITS = {d: 1 << i for i, d in enumerate(Weekdays)}
+ALL_DAYS = (1 << len(Weekdays)) - 1
+
 
 class Roles(enum.StrEnum):
     ADMIN = enum.auto()
@@ -26,6 +68,24 @@ class Roles(enum.StrEnum):
     RESTAURATEUR = enum.auto()
 
 
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(primary_key=True)
+
+
+class MenuGeneration(Base):
+    """
+    A single row, counting the commits that changed menus or candidates, in every process. No
+    row yet is generation 0.
+    """
+
+    __tablename__ = "menu_generation"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    generation: Mapped[int]
+
+
 class Item(Base):
     __tablename__ = "items"
 
@@ -37,6 +97,53 @@ class Item(Base):
     description: Mapped[str | None] = mapped_column(VARCHAR(255))
 
     restaurant_id = mapped_column(ForeignKey("restaurants.id"))
+    # The days whose menus it's on, a ``Weekdays.bit`` each, when ``MENU_DAYS_MASK`` is set.
+    # Otherwise ``menu_items`` says, and this stays 0.
+    days: Mapped[int] = mapped_column(default=0, server_default="0")
+
+    __table_args__ = (Index("ix_items_restaurant_days", "restaurant_id", "days"),)
+
+
+# Full-text index over ``items``, on SQLite builds that have FTS5. It's an external content
+# table, ``crud.add_items`` and ``crud.delete_items`` keep it in sync.
+ITEMS_FTS = "items_fts"
+CREATE_ITEMS_FTS = text(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {ITEMS_FTS} USING fts5("
+    "name, description, content='items', content_rowid='id',"
+    " tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+
+def has_fts5(connection: Connection) -> bool:
+    if connection.dialect.name != "sqlite":
+        return False
+    options = connection.exec_driver_sql("PRAGMA compile_options").scalars()
+    return "ENABLE_FTS5" in options
+
+
+@event.listens_for(Item.__table__, "after_create")
+def create_items_fts(_: Table, connection: Connection, **__: Any) -> None:
+    if has_fts5(connection):
+        connection.execute(CREATE_ITEMS_FTS)
+
+
+@event.listens_for(Item.__table__, "before_drop")
+def drop_items_fts(_: Table, connection: Connection, **__: Any) -> None:
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {ITEMS_FTS}")
+
+
+class MenuItem(Base):
+    """
+    An item on its restaurant's menu for a day. Every restaurant has a menu every day, made of
+    these rows, a ``DailyMenu`` row is only there to give one a title.
+    """
+
+    __tablename__ = "menu_items"
+
+    restaurant_id = mapped_column(ForeignKey("restaurants.id"), primary_key=True)
+    day: Mapped[Weekdays] = mapped_column(primary_key=True)
+    item_id = mapped_column(ForeignKey("items.id"), primary_key=True, index=True)
 
 
 class DailyMenu(Base):
@@ -47,14 +154,19 @@ class DailyMenu(Base):
     day: Mapped[Weekdays]
 
     restaurant_id = mapped_column(ForeignKey("restaurants.id"))
-    items: Mapped[list["AssocItemDailyMenu"]] = relationship()
-
-
-class AssocItemDailyMenu(Base):
-    __tablename__ = "items_daily_menus"
+    items: Mapped[list[Item]] = relationship(
+        secondary=MenuItem.__table__,
+        primaryjoin=lambda: and_(
+            foreign(MenuItem.restaurant_id) == DailyMenu.restaurant_id,
+            foreign(MenuItem.day) == DailyMenu.day,
+        ),
+        secondaryjoin=lambda: foreign(MenuItem.item_id) == Item.id,
+        viewonly=True,
+    )
 
-    item_id = mapped_column(ForeignKey("items.id"), primary_key=True)
-    daily_menu_id = mapped_column(ForeignKey("daily_menus.id"), primary_key=True)
+    __table_args__ = (
+        Index("ix_daily_menus_restaurant_day", "restaurant_id", "day", unique=True),
+    )
 
 
 class Restaurant(Base):
@@ -80,6 +192,17 @@ class User(Base):
     restaurant_id = mapped_column(ForeignKey("restaurants.id"))
 
 
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id = mapped_column(ForeignKey(User.id), nullable=False, index=True)
+    token_hash: Mapped[str] = mapped_column(VARCHAR(64), unique=True, nullable=False)
+    expires_at: Mapped[datetime]
+
+    created_at: Mapped[datetime] = mapped_column(server_default=now())  # type: ignore[no-untyped-call]
+
+
 class Vote(Base):
     __tablename__ = "votes"
 
@@ -97,8 +220,6 @@ class Vote(Base):
     # TODO: After vote ends:
     # 1. compute winner
     # 2. archive to separate table
-    # 3. select candidates for the next day (exclude candidate
-    #    they won yesterday and the day before that).
 
 
 class VoteWinner(Base):
@@ -117,3 +238,34 @@ class VoteWinner(Base):
     __table_args__ = (
         UniqueConstraint("restaurant_id", "voting_date"),
     )  # In case celery worker runs twice...
+
+
+class VoteCandidate(Base):
+    """
+    Restaurants that can be voted for on a day, see ``crud.compute_candidates``.
+    """
+
+    __tablename__ = "vote_candidates"
+
+    voting_date: Mapped[date] = mapped_column(primary_key=True)
+    restaurant_id = mapped_column(ForeignKey(Restaurant.id), primary_key=True)
+
+
+class VoteDailyTotal(Base):
+    """
+    Votes per restaurant per day, written when a day is finalized so analytics never scan
+    ``votes``.
+    """
+
+    __tablename__ = "vote_daily_totals"
+
+    voting_date: Mapped[date] = mapped_column(primary_key=True)
+    restaurant_id = mapped_column(ForeignKey(Restaurant.id), primary_key=True)
+    votes: Mapped[int]
+
+    # Covers a restaurant's stats, see ``crud.get_vote_stats``.
+    __table_args__ = (
+        Index(
+            "ix_vote_daily_totals_restaurant", "restaurant_id", "voting_date", "votes"
+        ),
+    )
@@ -0,0 +1,206 @@
+"""
+Opt-in, per-request sampling profiler.
+
+A request is profiled when an admin sends it with an ``X-Profile`` header, or when it's picked at
+``PROFILE_SAMPLE_RATE``. Other requests only pay for that check.
+
+Sync handlers and their dependencies run on threadpool threads, so the threads doing a profiled
+request's work are tracked through ``attach``, which ``get_db``, ``auth.unpack_jwt`` and every
+query call. While any profiled request is in flight, a sampler thread records the stacks of its
+threads every ``PROFILE_INTERVAL_MS``. Each profile is written as JSON to ``PROFILE_DIR``, oldest
+files are removed past ``PROFILE_DIR_MAX_BYTES``.
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from types import FrameType
+
+import anyio
+from fastapi import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import get_settings
+from models import Roles
+
+# Stacks without a frame from the app's own modules are idle threads, they're not recorded.
+APP_ROOT = str(Path(__file__).resolve().parent)
+SITE_PACKAGES = ("site-packages", "dist-packages")
+
+
+def _thread_cpu(ident: int) -> float:
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):  # Not on Linux, or the thread is gone.
+        return 0.0
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        # Thread CPU time of each attached thread when it was attached.
+        self.threads: dict[int, float] = {}
+        self.cpu = 0.0
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+
+    def finish(self) -> None:
+        self.wall = time.perf_counter() - self.started
+        # Approximate: a thread that moved on to other requests meanwhile is counted in full.
+        self.cpu = sum(_thread_cpu(i) - cpu for i, cpu in self.threads.items())
+
+    def to_json(self, status: int) -> str:
+        return json.dumps(
+            {
+                "method": self.method,
+                "path": self.path,
+                "status": status,
+                "wall_ms": round(self.wall * 1000, 3),
+                "cpu_ms": round(self.cpu * 1000, 3),
+                "interval_ms": get_settings().PROFILE_INTERVAL_MS,
+                "samples": self.samples,
+                # Folded stacks, root first, as flamegraph tools expect them.
+                "stacks": dict(self.stacks.most_common()),
+            }
+        )
+
+
+_current: ContextVar[RequestProfile | None] = ContextVar("profile", default=None)
+_in_flight: set[RequestProfile] = set()
+_lock = threading.Lock()
+_sampler: threading.Thread | None = None
+
+
+def attach() -> None:
+    """
+    Count the calling thread's work toward the request being profiled, if there's one.
+    """
+    profile = _current.get()
+    if profile is not None:
+        ident = threading.get_ident()
+        if ident not in profile.threads:
+            profile.threads[ident] = _thread_cpu(ident)
+
+
+def _fold(frame: FrameType | None) -> str | None:
+    names = []
+    in_app = False
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_ROOT) and not any(
+            i in filename for i in SITE_PACKAGES
+        ):
+            in_app = True
+        names.append(f"{Path(filename).stem}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names)) if in_app else None
+
+
+def _sample() -> None:
+    global _sampler
+
+    while True:
+        time.sleep(get_settings().PROFILE_INTERVAL_MS / 1000)
+        frames = sys._current_frames()
+        with _lock:
+            if not _in_flight:
+                _sampler = None
+                return
+            for profile in _in_flight:
+                profile.samples += 1
+                for ident in list(profile.threads):
+                    stack = _fold(frames.get(ident))
+                    if stack is not None:
+                        profile.stacks[stack] += 1
+
+
+def _start(profile: RequestProfile) -> None:
+    global _sampler
+
+    with _lock:
+        _in_flight.add(profile)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample, name="profiler", daemon=True)
+            _sampler.start()
+
+
+def _stop(profile: RequestProfile) -> None:
+    with _lock:
+        _in_flight.discard(profile)
+    profile.finish()
+
+
+def _write(profile: RequestProfile, status: int) -> None:
+    settings = get_settings()
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    name = (
+        f"{time.time_ns()}-{profile.method}-{profile.path.strip('/').replace('/', '_')}"
+    )
+    (directory / f"{name}.json").write_text(profile.to_json(status))
+
+    # Keep within the disk budget, oldest profiles go first.
+    files = sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime_ns)
+    total = sum(p.stat().st_size for p in files)
+    for p in files[:-1]:
+        if total <= settings.PROFILE_DIR_MAX_BYTES:
+            break
+        total -= p.stat().st_size
+        p.unlink(missing_ok=True)
+
+
+def _requested_by_admin(scope: Scope) -> bool:
+    if not any(name == b"x-profile" for name, _ in scope["headers"]):
+        return False
+
+    import auth  # It calls ``attach`` itself.
+
+    headers = dict(scope["headers"])
+    scheme, _, token = headers.get(b"authorization", b"").decode().partition(" ")
+    if scheme.lower() != "bearer":
+        return False
+    try:
+        return auth.unpack_jwt(token).role == Roles.ADMIN
+    except HTTPException:
+        return False
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    def _triggered(self, scope: Scope) -> bool:
+        rate = get_settings().PROFILE_SAMPLE_RATE
+        return (rate > 0 and random.random() < rate) or _requested_by_admin(scope)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._triggered(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current.set(profile)
+        _start(profile)
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            _current.reset(token)
+            _stop(profile)
+            await anyio.to_thread.run_sync(_write, profile, status)
@@ -0,0 +1,97 @@
+"""
+In-memory sliding window rate limits, per process.
+
+A ``SlidingWindow`` remembers when each key was let through within the last ``window`` seconds,
+at most ``limit`` times, and refuses it once that's full until the oldest one ages out. Refused
+hits aren't remembered, so a client hammering away is let through again as soon as its window
+allows. It tracks at most ``max_keys`` keys: expired ones are dropped as new ones come in, and
+past that the least recently seen one goes.
+
+``hit_all`` checks a hit against several windows at once, and records it in all of them only if
+none refuses it. A hit refused by one window then doesn't use up another's allowance.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Hashable, Sequence
+from contextlib import ExitStack
+
+
+class SlidingWindow:
+    def __init__(self, limit: int, window: float, max_keys: int) -> None:
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._hits: OrderedDict[Hashable, deque[float]] = OrderedDict()
+        self._allowed = self._refused = self._evicted = 0
+
+    def _make_room(self, now: float) -> None:
+        while self._hits:
+            hits = next(iter(self._hits.values()))
+            expired = not hits or hits[-1] <= now - self.window
+            if not expired and len(self._hits) < self.max_keys:
+                return
+            if not expired:
+                self._evicted += 1
+            self._hits.popitem(last=False)
+
+    def _recent(self, key: Hashable, now: float) -> deque[float]:
+        """
+        When ``key`` was let through within the window. Holding ``_lock``.
+        """
+        hits = self._hits.get(key)
+        if hits is None:
+            self._make_room(now)
+            hits = self._hits[key] = deque()
+        else:
+            self._hits.move_to_end(key)
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+        return hits
+
+    def hit(self, key: Hashable) -> int | None:
+        """
+        ``None`` if ``key`` is let through, otherwise the seconds until it would be.
+        """
+        refused = hit_all([(self, key)])
+        return None if refused is None else refused[1]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "allowed": self._allowed,
+                "refused": self._refused,
+                "evicted": self._evicted,
+                "keys": len(self._hits),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hits.clear()
+            self._allowed = self._refused = self._evicted = 0
+
+
+def hit_all(limits: Sequence[tuple[SlidingWindow, Hashable]]) -> tuple[int, int] | None:
+    """
+    A hit on each window of ``limits``, for the key alongside it, recorded only if all of them let
+    it through. ``None`` if they did, otherwise the index of the first one that refused it and the
+    seconds until it would let it through. Windows are locked in order, so every caller should
+    pass them in the same order.
+    """
+    now = time.monotonic()
+    with ExitStack() as held:
+        for window, _ in limits:
+            held.enter_context(window._lock)
+        recent = [window._recent(key, now) for window, key in limits]
+
+        for i, ((window, _), hits) in enumerate(zip(limits, recent)):
+            if len(hits) >= window.limit:
+                window._refused += 1
+                return i, max(1, math.ceil(hits[0] + window.window - now))
+        for (window, _), hits in zip(limits, recent):
+            hits.append(now)
+            window._allowed += 1
+    return None
@@ -30,6 +30,25 @@ class Item(ItemCreate):
     id: int
 
 
+class WeekMenu(BaseModel):
+    items: list[Item]
+    days: dict[
+        Weekdays, list[int]
+    ]  # Ids of the ``items`` on each day's menu, every day.
+
+
+class ItemSearchResult(Item):
+    restaurant_id: int
+    restaurant: str
+
+
+class TodayMenu(BaseModel):
+    restaurant_id: int
+    restaurant: str
+    title: str | None
+    items: list[Item]
+
+
 class PatchMenuOp(enum.StrEnum):
     ADD = enum.auto()  # Add the already existing items to some day's menu.
     REMOVE = enum.auto()  # Remove from some day's menu, but don't delete.
@@ -80,6 +99,15 @@ class RestaurantCreate(RestaurantBase):
     pass
 
 
+class RestaurantsCreateBulk(BaseModel):
+    restaurants: list[RestaurantCreate] = Field(min_length=1, max_length=1000)
+
+
+class RestaurantBulkResult(BaseModel):
+    name: str
+    id: int | None  # ``None`` if the name was taken.
+
+
 class UserBase(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -116,9 +144,34 @@ class EmployeeVoteHistory(BaseModel):
     restaurant: str
 
 
+class Candidate(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+
+
 class VoteWinner(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     voting_date: date
     restaurant: str
     votes: int
+
+
+class StatsPeriod(enum.StrEnum):
+    WEEK = enum.auto()  # Weeks start on Sunday, like ``Weekdays``.
+    MONTH = enum.auto()
+
+
+class ExportFormat(enum.StrEnum):
+    CSV = enum.auto()
+    JSONL = enum.auto()
+
+
+class VoteStats(BaseModel):
+    period_start: date
+    restaurant_id: int
+    restaurant: str
+    votes: int
+    share: float  # Of all the votes cast in the period.
@@ -0,0 +1,111 @@
+"""
+Coalescing of concurrent identical reads.
+
+``Group.do(key, fetch)`` runs ``fetch`` unless a call for the same ``key`` is already running,
+in which case it waits for that one and returns its result, or raises its exception, instead.
+When everyone refreshes the winners at the deadline, the database answers once per batch of
+requests rather than once per request.
+
+Callers that join a running call get what it read, which may be up to one fetch older than what
+they'd have read themselves. Where a caller must see its own writes, put something that changes
+with them in the key, e.g. ``crud.menu_generation``.
+
+Handlers run on the threadpool, so this is all threads and locks.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: T
+        self.error: BaseException | None = None
+
+
+class KeyStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.fetches = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "calls": self.calls,
+            "fetches": self.fetches,
+            "collapsed": self.calls - self.fetches,
+        }
+
+
+_groups: weakref.WeakSet["Group[object]"] = weakref.WeakSet()
+
+
+class Group(Generic[T]):
+    """
+    Counts calls and fetches for the ``max_keys`` most recently used keys.
+    """
+
+    def __init__(self, name: str, max_keys: int = 1000) -> None:
+        self.name = name
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call[T]] = {}
+        self._stats: OrderedDict[Hashable, KeyStats] = OrderedDict()
+        _groups.add(self)  # type: ignore[arg-type]
+
+    def _stats_of(self, key: Hashable) -> KeyStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = KeyStats()
+            if len(self._stats) > self.max_keys:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(key)
+        return stats
+
+    def do(self, key: Hashable, fetch: Callable[[], T]) -> T:
+        with self._lock:
+            stats = self._stats_of(key)
+            stats.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+                stats.fetches += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fetch()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {str(k): v.as_dict() for k, v in self._stats.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+def stats() -> dict[str, dict[str, dict[str, int]]]:
+    """
+    Per group, per key: calls, fetches, and calls collapsed into another's fetch.
+    """
+    return {g.name: g.stats() for g in _groups}
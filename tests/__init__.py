@@ -12,6 +12,7 @@ def override_get_settings() -> config.Settings:
         # SQLALCHEMY_DATABASE_URL="postgresql+psycopg://postgres@localhost/bongo",
         SQLALCHEMY_DATABASE_URL="sqlite:///./test.db",
         VOTING_ENDS_AT=time(12),
+        BCRYPT_ROUNDS=4,
     )
 
 
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+import sqlalchemy.exc
+from fastapi import status
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+from starlette.types import Message, Receive, Scope, Send
+
+import admission
+from config import get_settings
+from database import get_db
+from main import app
+
+
+def test_sheds_load_once_the_expected_wait_is_too_long(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(admission, "capacity", lambda: 2)
+    monkeypatch.setattr(admission, "_load", None)
+    release = asyncio.Event()
+
+    async def handler(scope: Scope, receive: Receive, send: Send) -> None:
+        await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    middleware = admission.AdmissionMiddleware(handler)
+
+    async def request() -> tuple[int, dict[bytes, bytes]]:
+        messages: list[Message] = []
+
+        async def send(message: Message) -> None:
+            messages.append(message)
+
+        async def receive() -> Message:
+            return {"type": "http.request"}
+
+        await middleware({"type": "http", "method": "GET", "path": "/"}, receive, send)
+        return messages[0]["status"], dict(messages[0]["headers"])
+
+    async def run() -> list[tuple[int, dict[bytes, bytes]]]:
+        waiting = [asyncio.create_task(request()) for _ in range(6)]
+        while admission.stats().get("waiting") != 4:
+            await asyncio.sleep(0)
+        # Serving takes a second, as far as the middleware knows. Two are being served and four
+        # wait, so the next one starts in three seconds.
+        assert admission.stats()["running"] == 2
+        assert admission._load is not None
+        admission._load.service_time = 1.0
+        shed = await request()
+        release.set()
+        return [shed, *await asyncio.gather(*waiting)]
+
+    monkeypatch.setattr(get_settings(), "ADMISSION_MAX_WAIT_SECONDS", 2.5)
+    shed, *served = asyncio.run(run())
+
+    assert shed[0] == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert shed[1][b"retry-after"] == b"3"
+    assert [s for s, _ in served] == [status.HTTP_200_OK] * 6
+    assert admission.stats()["rejected"] == 1
+    assert admission.stats()["running"] == 0
+
+
+def test_exports_dont_turn_others_away(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(admission, "capacity", lambda: 1)
+    monkeypatch.setattr(admission, "_load", None)
+    monkeypatch.setattr(get_settings(), "ADMISSION_MAX_WAIT_SECONDS", 0.01)
+    exported = asyncio.Event()
+
+    async def handler(scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["path"].startswith("/export/"):
+            await exported.wait()  # As long as the client takes to read it.
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    middleware = admission.AdmissionMiddleware(handler, streaming=("/export/",))
+
+    async def request(path: str) -> int:
+        messages: list[Message] = []
+
+        async def send(message: Message) -> None:
+            messages.append(message)
+
+        async def receive() -> Message:
+            return {"type": "http.request"}
+
+        await middleware({"type": "http", "method": "GET", "path": path}, receive, send)
+        return int(messages[0]["status"])
+
+    async def run() -> list[int]:
+        exports = [asyncio.create_task(request("/export/votes")) for _ in range(3)]
+        await asyncio.sleep(0.1)
+        # The exports hold no slot meanwhile, and their time isn't taken for service time.
+        during = await asyncio.wait_for(request("/today"), 1)
+        exported.set()
+        return [during, *await asyncio.gather(*exports), await request("/today")]
+
+    statuses = asyncio.run(run())
+
+    assert statuses == [status.HTTP_200_OK] * 5
+    assert admission.stats()["service_time_ms"] < 10
+    assert admission.stats()["rejected"] == 0
+
+
+def test_pool_timeouts_are_503s(
+    client: TestClient, restaurateur_auth_token: str
+) -> None:
+    def exhausted() -> None:
+        raise sqlalchemy.exc.TimeoutError("QueuePool limit reached")
+
+    app.dependency_overrides[get_db] = exhausted
+    try:
+        r = client.get(
+            "/menu/", headers={"Authorization": f"Bearer {restaurateur_auth_token}"}
+        )
+    finally:
+        del app.dependency_overrides[get_db]
+
+    assert r.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert r.headers["Retry-After"] == "1"
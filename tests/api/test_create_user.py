@@ -1,5 +1,13 @@
+from typing import Any
+
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import auth
+import database
+from models import Roles
 
 
 def test_create_user(client: TestClient, admin_auth_token: str) -> None:
@@ -52,6 +60,55 @@ def test_create_restaurateur_validates_restaurant(
     assert r.status_code == status.HTTP_404_NOT_FOUND
 
 
+def test_taken_username_conflicts_before_a_missing_restaurant(
+    client: TestClient, admin_auth_token: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def hashed(_: str) -> str:
+        raise AssertionError("hashed a password for a taken username")
+
+    monkeypatch.setattr(auth, "get_password_hash", hashed)
+    r = client.post(
+        "/users",
+        json={
+            "username": "restaurateur1",
+            "password": "hello123",
+            "role": "restaurateur",
+            "email": "email4@email.com",
+            "restaurant_id": 0xDEAD,
+        },
+        headers={"Authorization": f"Bearer {admin_auth_token}"},
+    )
+
+    assert r.status_code == status.HTTP_409_CONFLICT
+    assert r.json()["detail"] == "Username already registered"
+
+
+def test_taken_username_is_one_query(client: TestClient, admin_auth_token: str) -> None:
+    statements: list[str] = []
+
+    def executed(*args: Any) -> None:
+        statements.append(args[2])
+
+    event.listen(database.engine, "before_cursor_execute", executed)
+    try:
+        r = client.post(
+            "/users",
+            json={
+                "username": "employee1",
+                "password": "hello123",
+                "role": "employee",
+                "email": "employee1@email.com",
+            },
+            headers={"Authorization": f"Bearer {admin_auth_token}"},
+        )
+    finally:
+        event.remove(database.engine, "before_cursor_execute", executed)
+
+    assert r.status_code == status.HTTP_409_CONFLICT
+    assert r.json()["detail"] == "Username and Email already registered"
+    assert len(statements) == 1
+
+
 def test_non_admin_cant_create_user(
     client: TestClient, employee_auth_token: str
 ) -> None:
@@ -109,3 +166,26 @@ def test_username_email_conflicts(client: TestClient, admin_auth_token: str) ->
         assert r.status_code == status.HTTP_409_CONFLICT
         assert "detail" in err_msg
         assert err_msg["detail"] == v
+
+
+def test_create_restaurateur(client: TestClient, admin_auth_token: str) -> None:
+    r = client.post(
+        "/users",
+        json={
+            "username": "newrestaurateur4",
+            "password": "hello123",
+            "role": "restaurateur",
+            "email": "email5@email.com",
+            "restaurant_id": 1,
+        },
+        headers={"Authorization": f"Bearer {admin_auth_token}"},
+    )
+    assert r.status_code == status.HTTP_201_CREATED
+    assert r.json()["role"] == "restaurateur"
+
+    r = client.post(
+        "/login", data={"username": "newrestaurateur4", "password": "hello123"}
+    )
+    assert r.status_code == status.HTTP_200_OK
+    token = auth.unpack_jwt(r.json()["access_token"])
+    assert (token.role, token.restaurant_id) == (Roles.RESTAURATEUR, 1)
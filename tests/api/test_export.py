@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from datetime import date
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from database import SessionLocal
+from models import Vote, VoteWinner
+
+
+def add_votes() -> None:
+    with SessionLocal() as db:
+        db.add_all(
+            [
+                Vote(user_id=2, restaurant_id=1, voting_date=date(2023, 10, 25)),
+                Vote(user_id=4, restaurant_id=2, voting_date=date(2023, 10, 25)),
+                Vote(user_id=2, restaurant_id=2, voting_date=date(2023, 10, 26)),
+                VoteWinner(restaurant_id=1, votes=1, voting_date=date(2023, 10, 25)),
+                VoteWinner(restaurant_id=2, votes=1, voting_date=date(2023, 10, 25)),
+            ]
+        )
+        db.commit()
+
+
+def test_export_votes_csv(client: TestClient, admin_auth_token: str) -> None:
+    add_votes()
+    r = client.get(
+        "/export/votes?from=2023-10-26",
+        headers={"Authorization": f"Bearer {admin_auth_token}"},
+    )
+
+    assert r.status_code == status.HTTP_200_OK
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [(i["username"], i["restaurant"], i["voting_date"]) for i in rows] == [
+        ("employee1", "restaurant2", "2023-10-26")
+    ]
+
+
+def test_export_winners_jsonl(client: TestClient, admin_auth_token: str) -> None:
+    add_votes()
+    r = client.get(
+        "/export/winners?format=jsonl&to=2023-10-25",
+        headers={"Authorization": f"Bearer {admin_auth_token}"},
+    )
+
+    assert r.status_code == status.HTTP_200_OK
+    rows = [json.loads(i) for i in r.text.splitlines()]
+    assert [(i["restaurant"], i["votes"]) for i in rows] == [
+        ("restaurant1", 1),
+        ("restaurant2", 1),
+    ]
+
+
+def test_export_empty_csv_has_header(client: TestClient, admin_auth_token: str) -> None:
+    r = client.get(
+        "/export/winners",
+        headers={"Authorization": f"Bearer {admin_auth_token}"},
+    )
+
+    assert r.status_code == status.HTTP_200_OK
+    assert r.text.splitlines() == [
+        "id,restaurant_id,restaurant,votes,voting_date,created_at"
+    ]
+
+
+def test_non_admin_cant_export(client: TestClient, employee_auth_token: str) -> None:
+    r = client.get(
+        "/export/votes",
+        headers={"Authorization": f"Bearer {employee_auth_token}"},
+    )
+    assert r.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,74 @@
+import io
+import json
+import logging
+import queue
+from collections.abc import Generator
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+import log
+from config import get_settings
+
+
+@pytest.fixture
+def output() -> Generator[io.StringIO, None, None]:
+    log.shutdown()
+    stream = io.StringIO()
+    log.setup(stream)
+    yield stream
+    log.shutdown()
+
+
+def records(stream: io.StringIO) -> list[dict[str, object]]:
+    log.shutdown()  # Writes out whatever is still queued.
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_access_record_carries_request_context(
+    client: TestClient, employee_auth_token: str, output: io.StringIO
+) -> None:
+    r = client.get(
+        "/vote/candidates", headers={"Authorization": f"Bearer {employee_auth_token}"}
+    )
+    assert r.status_code == status.HTTP_200_OK
+
+    (access,) = [i for i in records(output) if i["message"] == "request"]
+    assert access["route"] == "/vote/candidates"
+    assert access["method"] == "GET"
+    assert access["user_id"] == 2
+    assert access["status"] == 200
+    assert isinstance(access["queries"], int) and access["queries"] > 0
+
+
+def test_records_in_a_request_carry_its_context(
+    client: TestClient, output: io.StringIO
+) -> None:
+    client.post("/login", data={"username": "nobody", "password": "pass1"})
+
+    (failed,) = [i for i in records(output) if i["message"] == "login failed"]
+    assert failed["level"] == "WARNING"
+    assert failed["route"] == "/login"
+    assert failed["username"] == "nobody"
+
+
+def test_overload_samples_then_drops(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings(), "LOG_OVERLOAD_THRESHOLD", 0.5)
+    monkeypatch.setattr(get_settings(), "LOG_OVERLOAD_SAMPLE_RATE", 0.0)
+    q: queue.Queue[logging.LogRecord] = queue.Queue(2)
+    handler = log.BoundedQueueHandler(q)
+    before = log.stats()
+
+    def emit(level: int) -> None:
+        handler.emit(logging.makeLogRecord({"levelno": level}))
+
+    emit(logging.INFO)  # Queued.
+    emit(logging.INFO)  # Half full, sampled out.
+    emit(logging.WARNING)  # Warnings aren't sampled, queued.
+    emit(logging.ERROR)  # Full, dropped.
+
+    after = log.stats()
+    assert q.qsize() == 2
+    assert after["sampled_out"] - before["sampled_out"] == 1
+    assert after["dropped"] - before["dropped"] == 1
@@ -1,7 +1,16 @@
+from collections.abc import Generator
+
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
+from passlib.context import CryptContext
 
+import auth
+import crud
+import main
+import ratelimit
 from config import get_settings
+from database import SessionLocal
 
 
 def test_get_access_token(client: TestClient) -> None:
@@ -27,3 +36,140 @@ def test_incorrect_password(client: TestClient) -> None:
     assert "access_token" not in err_msg
     assert "detail" in err_msg
     assert err_msg["detail"] == "Incorrect username or password"
+
+
+@pytest.fixture
+def bcrypt_rounds(monkeypatch: pytest.MonkeyPatch) -> Generator[int, None, None]:
+    """
+    The calibrated cost, one above the cheapest one.
+    """
+    monkeypatch.setattr(get_settings(), "BCRYPT_ROUNDS", 5)
+    auth.get_pwd_context.cache_clear()
+    yield 5
+    auth.get_pwd_context.cache_clear()
+
+
+def set_root_password_rounds(rounds: int) -> str:
+    with SessionLocal() as db:
+        root = crud.get_user(db, get_settings().ROOT_USERNAME)
+        assert root is not None
+        root.password = CryptContext(schemes=["bcrypt"]).hash(
+            get_settings().ROOT_PASSWORD, rounds=rounds
+        )
+        db.commit()
+        return root.password
+
+
+def login_as_root(client: TestClient) -> str:
+    login_data = {
+        "username": get_settings().ROOT_USERNAME,
+        "password": get_settings().ROOT_PASSWORD,
+    }
+    assert client.post("/login", data=login_data).status_code == status.HTTP_200_OK
+    with SessionLocal() as db:
+        root = crud.get_user(db, get_settings().ROOT_USERNAME)
+        assert root is not None
+        return root.password
+
+
+def test_login_rehashes_password_with_outdated_cost(
+    client: TestClient, bcrypt_rounds: int
+) -> None:
+    set_root_password_rounds(bcrypt_rounds - 1)
+
+    password = login_as_root(client)
+    assert password.startswith(f"$2b${bcrypt_rounds:02}$")
+    assert auth.verify_password(get_settings().ROOT_PASSWORD, password)
+
+
+def test_login_keeps_passwords_hashed_at_a_higher_cost(
+    client: TestClient, bcrypt_rounds: int
+) -> None:
+    # E.g. by a faster machine, which calibrated higher.
+    password = set_root_password_rounds(bcrypt_rounds + 1)
+
+    assert login_as_root(client) == password
+
+
+def test_refresh_token_rotates(client: TestClient) -> None:
+    login_data = {
+        "username": get_settings().ROOT_USERNAME,
+        "password": get_settings().ROOT_PASSWORD,
+    }
+    refresh_token = client.post("/login", data=login_data).json()["refresh_token"]
+
+    r = client.post("/token/refresh", json={"refresh_token": refresh_token})
+    tokens = r.json()
+    assert r.status_code == status.HTTP_200_OK
+    assert auth.unpack_jwt(tokens["access_token"]).username == login_data["username"]
+    assert tokens["refresh_token"] not in ("", refresh_token)
+
+    # The old one was consumed by the rotation.
+    r = client.post("/token/refresh", json={"refresh_token": refresh_token})
+    assert r.status_code == status.HTTP_401_UNAUTHORIZED
+
+    r = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert r.status_code == status.HTTP_200_OK
+
+
+def test_refresh_token_rejects_garbage(client: TestClient) -> None:
+    r = client.post("/token/refresh", json={"refresh_token": "garbage"})
+    assert r.status_code == status.HTTP_401_UNAUTHORIZED
+    assert r.json()["detail"] == "Invalid or expired refresh token"
+
+
+def test_login_attempts_are_limited_per_username(client: TestClient) -> None:
+    for _ in range(get_settings().LOGIN_ATTEMPTS_PER_USERNAME):
+        r = client.post("/login", data={"username": "nobody", "password": "x"})
+        assert r.status_code == status.HTTP_401_UNAUTHORIZED
+
+    r = client.post("/login", data={"username": "nobody", "password": "x"})
+    assert r.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert 0 < int(r.headers["Retry-After"]) <= get_settings().LOGIN_WINDOW_SECONDS
+
+    r = client.post("/login", data={"username": "somebody", "password": "x"})
+    assert r.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_login_attempts_are_limited_per_ip(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(main.login_limits["ip"], "limit", 3)
+    for i in range(3):
+        r = client.post("/login", data={"username": f"nobody{i}", "password": "x"})
+        assert r.status_code == status.HTTP_401_UNAUTHORIZED
+
+    r = client.post("/login", data={"username": "nobody", "password": "x"})
+    assert r.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+
+def test_attempts_refused_for_the_username_dont_count_against_the_ip(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(main.login_limits["ip"], "limit", 3)
+    monkeypatch.setattr(main.login_limits["username"], "limit", 1)
+    for _ in range(5):
+        client.post("/login", data={"username": "targeted", "password": "x"})
+
+    # Only the first one was let through, the others behind the same address still get two.
+    for i in range(2):
+        r = client.post("/login", data={"username": f"nobody{i}", "password": "x"})
+        assert r.status_code == status.HTTP_401_UNAUTHORIZED
+    assert main.login_limits["ip"].stats()["allowed"] == 3
+
+
+def test_sliding_window_expires_and_evicts(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 1000.0
+    monkeypatch.setattr("ratelimit.time.monotonic", lambda: now)
+    limit = ratelimit.SlidingWindow(limit=2, window=60, max_keys=2)
+
+    assert limit.hit("a") is None
+    now += 30
+    assert limit.hit("a") is None
+    assert limit.hit("a") == 30
+    now += 30
+    assert limit.hit("a") is None  # The first one aged out.
+
+    assert limit.hit("b") is None
+    assert limit.hit("c") is None  # No room for "a" any more.
+    assert limit.stats() == {"allowed": 5, "refused": 1, "evicted": 1, "keys": 2}
@@ -1,8 +1,13 @@
+from pathlib import Path
 from typing import Any
 
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 
+import catalog
+from config import get_settings
+
 by_name = lambda x: x["name"]
 
 
@@ -53,6 +58,33 @@ def test_get_items_returns_all(
     assert items1 + items2 + items3 + items4 == r.json()
 
 
+@pytest.mark.parametrize("days_mask", [False, True])
+def test_get_week(
+    client: TestClient,
+    restaurateur_auth_token: str,
+    monkeypatch: pytest.MonkeyPatch,
+    days_mask: bool,
+) -> None:
+    monkeypatch.setattr(get_settings(), "MENU_DAYS_MASK", days_mask)
+    items1, items2, items3, items4 = create_dummy_items(client, restaurateur_auth_token)
+    r = client.get(
+        "/menu/week",
+        headers={"Authorization": f"Bearer {restaurateur_auth_token}"},
+    )
+
+    assert r.status_code == status.HTTP_200_OK
+    assert r.json()["items"] == items1 + items2 + items3 + items4
+    assert r.json()["days"] == {
+        "sunday": [i["id"] for i in items2 + items4],
+        "saturday": [],
+        "monday": [i["id"] for i in items3 + items4],
+        "tuesday": [],
+        "wednesday": [],
+        "thursday": [],
+        "friday": [],
+    }
+
+
 def test_create_item(client: TestClient, restaurateur_auth_token: str) -> None:
     items = [
         {"name": "Item1", "price": 420},
@@ -300,3 +332,30 @@ def test_remove_from_menu(client: TestClient, restaurateur_auth_token: str) -> N
     )
     assert r.status_code == status.HTTP_200_OK
     assert items1 == r.json()
+
+
+def test_get_items_from_catalog(
+    client: TestClient,
+    restaurateur_auth_token: str,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings(), "CATALOG_DIR", str(tmp_path))
+    monkeypatch.setattr(catalog, "_mapped", None)
+    items1, items2, items3, items4 = create_dummy_items(client, restaurateur_auth_token)
+    assert catalog.flush(5)
+    assert catalog.generation() is not None
+
+    for query, expected in [
+        ("", items1),
+        ("?day=sunday", items2 + items4),
+        ("?day=monday", items3 + items4),
+        ("?all=true", items1 + items2 + items3 + items4),
+    ]:
+        r = client.get(
+            f"/menu{query}",
+            headers={"Authorization": f"Bearer {restaurateur_auth_token}"},
+        )
+        assert r.status_code == status.HTTP_200_OK
+        assert r.json() == expected
+        assert r.headers["content-length"] == str(len(r.content))
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from config import get_settings
+
+
+@pytest.fixture
+def profile_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(get_settings(), "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_admin_can_profile_a_request(
+    client: TestClient, admin_auth_token: str, profile_dir: Path
+) -> None:
+    r = client.get(
+        "/export/winners",
+        headers={"Authorization": f"Bearer {admin_auth_token}", "X-Profile": "1"},
+    )
+    assert r.status_code == status.HTTP_200_OK
+
+    (profile,) = profile_dir.glob("*.json")
+    p = json.loads(profile.read_text())
+    assert (p["method"], p["path"], p["status"]) == ("GET", "/export/winners", 200)
+    assert p["wall_ms"] > 0
+
+
+def test_only_admins_can_profile(
+    client: TestClient, employee_auth_token: str, profile_dir: Path
+) -> None:
+    client.get(
+        "/vote/winners",
+        headers={"Authorization": f"Bearer {employee_auth_token}", "X-Profile": "1"},
+    )
+    assert list(profile_dir.glob("*.json")) == []
+
+
+def test_profiles_stay_within_budget(
+    client: TestClient,
+    admin_auth_token: str,
+    profile_dir: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_settings(), "PROFILE_DIR_MAX_BYTES", 1)
+    for _ in range(3):
+        client.get(
+            "/export/winners",
+            headers={"Authorization": f"Bearer {admin_auth_token}", "X-Profile": "1"},
+        )
+    assert len(list(profile_dir.glob("*.json"))) == 1
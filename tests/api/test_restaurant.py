@@ -1,5 +1,9 @@
 from fastapi import status
 from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+import models
+from database import SessionLocal
 
 
 def test_non_admin_cant_create_restaurant(
@@ -27,3 +31,40 @@ def test_create_restaurant(client: TestClient, admin_auth_token: str) -> None:
     )
     assert r.status_code == status.HTTP_201_CREATED
     assert "id" in r.json()
+
+
+def test_create_restaurants_in_bulk(client: TestClient, admin_auth_token: str) -> None:
+    r = client.post(
+        "/restaurants/bulk",
+        json={
+            "restaurants": [
+                {"name": "newrestaurant1"},
+                {"name": "restaurant1"},
+                {"name": "newrestaurant2", "description": "Food court, first floor."},
+                {"name": "newrestaurant1"},
+            ]
+        },
+        headers={"Authorization": f"Bearer {admin_auth_token}"},
+    )
+    assert r.status_code == status.HTTP_200_OK
+    assert r.json() == [
+        {"name": "newrestaurant1", "id": 3},
+        {"name": "restaurant1", "id": None},
+        {"name": "newrestaurant2", "id": 4},
+        {"name": "newrestaurant1", "id": None},
+    ]
+
+    # Their menus are implicit, nothing to insert for them.
+    with SessionLocal() as db:
+        assert db.scalars(select(models.DailyMenu)).all() == []
+
+
+def test_non_admin_cant_create_restaurants_in_bulk(
+    client: TestClient, restaurateur_auth_token: str
+) -> None:
+    r = client.post(
+        "/restaurants/bulk",
+        json={"restaurants": [{"name": "newrestaurant1"}]},
+        headers={"Authorization": f"Bearer {restaurateur_auth_token}"},
+    )
+    assert r.status_code == status.HTTP_403_FORBIDDEN
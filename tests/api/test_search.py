@@ -0,0 +1,93 @@
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+import crud
+
+
+def add_items(client: TestClient, restaurateur_auth_token: str) -> list[int]:
+    r = client.post(
+        "/menu",
+        json={
+            "days": ["monday"],
+            "items": [
+                {"name": "Chicken Curry", "price": 300},
+                {"name": "Beef Bhuna", "price": 450, "description": "With chicken"},
+                {"name": "Plain Rice", "price": 60},
+            ],
+        },
+        headers={"Authorization": f"Bearer {restaurateur_auth_token}"},
+    )
+    assert r.status_code == status.HTTP_201_CREATED
+    return [i["id"] for i in r.json()]
+
+
+def search(client: TestClient, token: str, query: str) -> list[str]:
+    r = client.get(
+        f"/menu/search?{query}", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert r.status_code == status.HTTP_200_OK
+    return [i["name"] for i in r.json()]
+
+
+@pytest.mark.parametrize("full_text", [True, False])
+def test_search_menu(
+    client: TestClient,
+    restaurateur_auth_token: str,
+    employee_auth_token: str,
+    monkeypatch: pytest.MonkeyPatch,
+    full_text: bool,
+) -> None:
+    if not full_text:
+        monkeypatch.setattr(crud, "_has_item_search", lambda _: False)
+    add_items(client, restaurateur_auth_token)
+
+    assert set(search(client, employee_auth_token, "q=chick")) == {
+        "Chicken Curry",
+        "Beef Bhuna",
+    }
+    assert search(client, employee_auth_token, "q=chicken curry") == ["Chicken Curry"]
+    assert search(client, employee_auth_token, "q=chicken&max_price=400") == [
+        "Chicken Curry"
+    ]
+    assert search(client, employee_auth_token, "q=rice&day=monday") == ["Plain Rice"]
+    assert search(client, employee_auth_token, "q=rice&day=sunday") == []
+    assert search(client, employee_auth_token, 'q="*') == []
+
+    r = client.get(
+        "/menu/search?q=rice",
+        headers={"Authorization": f"Bearer {employee_auth_token}"},
+    )
+    assert r.json()[0]["restaurant"] == "restaurant1"
+
+
+def test_search_ranks_name_matches_first(
+    client: TestClient, restaurateur_auth_token: str, employee_auth_token: str
+) -> None:
+    add_items(client, restaurateur_auth_token)
+    assert search(client, employee_auth_token, "q=chicken")[0] == "Chicken Curry"
+
+
+def test_deleted_items_are_not_found(
+    client: TestClient, restaurateur_auth_token: str, employee_auth_token: str
+) -> None:
+    ids = add_items(client, restaurateur_auth_token)
+    r = client.patch(
+        "/menu",
+        json={"op": "delete", "ids": ids[:1]},
+        headers={"Authorization": f"Bearer {restaurateur_auth_token}"},
+    )
+    assert r.status_code == status.HTTP_200_OK
+
+    assert search(client, employee_auth_token, "q=curry") == []
+    assert search(client, employee_auth_token, "q=chicken") == ["Beef Bhuna"]
+
+
+def test_only_employees_can_search(
+    client: TestClient, restaurateur_auth_token: str
+) -> None:
+    r = client.get(
+        "/menu/search?q=rice",
+        headers={"Authorization": f"Bearer {restaurateur_auth_token}"},
+    )
+    assert r.status_code == status.HTTP_403_FORBIDDEN
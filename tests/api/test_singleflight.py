@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+import main
+import singleflight
+
+
+def test_concurrent_calls_share_one_fetch() -> None:
+    group = singleflight.Group[int]("test")
+    release = threading.Event()
+    fetches = 0
+
+    def fetch() -> int:
+        nonlocal fetches
+        fetches += 1
+        release.wait()
+        return 42
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(group.do, "k", fetch) for _ in range(8)]
+        while group.stats()["k"]["calls"] < 8:
+            pass
+        release.set()
+        assert [f.result() for f in futures] == [42] * 8
+
+    assert fetches == 1
+    assert group.stats() == {"k": {"calls": 8, "fetches": 1, "collapsed": 7}}
+    assert group.do("k", lambda: 43) == 43  # Nothing in flight, fetched again.
+
+
+def test_errors_reach_every_caller() -> None:
+    group = singleflight.Group[int]("test")
+    release = threading.Event()
+
+    def fetch() -> int:
+        release.wait()
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(group.do, "k", fetch) for _ in range(2)]
+        while group.stats()["k"]["calls"] < 2:
+            pass
+        release.set()
+        for f in futures:
+            with pytest.raises(ValueError):
+                f.result()
+
+
+def test_stats_keep_the_most_recent_keys() -> None:
+    group = singleflight.Group[int]("test", max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        group.do(key, lambda: 0)
+
+    assert list(group.stats()) == ["a", "c"]
+
+
+def test_metrics(
+    client: TestClient, admin_auth_token: str, employee_auth_token: str
+) -> None:
+    main.winners.reset()
+    for _ in range(2):
+        r = client.get(
+            "/vote/winners?of_day=2023-01-02",
+            headers={"Authorization": f"Bearer {employee_auth_token}"},
+        )
+        assert r.status_code == status.HTTP_200_OK
+
+    r = client.get("/metrics", headers={"Authorization": f"Bearer {admin_auth_token}"})
+    assert r.status_code == status.HTTP_200_OK
+    assert r.json()["singleflight"]["winners"] == {
+        "2023-01-02": {"calls": 2, "fetches": 2, "collapsed": 0}
+    }
+    assert set(r.json()["log"]) == {"dropped", "sampled_out"}
+
+    r = client.get(
+        "/metrics", headers={"Authorization": f"Bearer {employee_auth_token}"}
+    )
+    assert r.status_code == status.HTTP_403_FORBIDDEN
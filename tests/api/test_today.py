@@ -0,0 +1,120 @@
+from datetime import datetime
+from typing import Any
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, update
+
+import crud
+import models
+from database import SessionLocal
+from models import Weekdays
+
+
+def get_today(client: TestClient, token: str) -> list[dict[str, Any]]:
+    r = client.get("/today", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == status.HTTP_200_OK
+    return r.json()  # type: ignore[no-any-return]
+
+
+def add_items(client: TestClient, token: str, day: Weekdays) -> list[dict[str, Any]]:
+    r = client.post(
+        "/menu",
+        json={"days": [day], "items": [{"name": f"Khichuri {day}", "price": 120}]},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert r.status_code == status.HTTP_201_CREATED
+    return r.json()  # type: ignore[no-any-return]
+
+
+def test_today_lists_candidates_with_todays_menu(
+    client: TestClient, restaurateur_auth_token: str, employee_auth_token: str
+) -> None:
+    today = Weekdays.of(datetime.now().date())
+    tomorrow = next(d for d in Weekdays if d != today)
+    items = add_items(client, restaurateur_auth_token, today)
+    add_items(client, restaurateur_auth_token, tomorrow)
+
+    assert get_today(client, employee_auth_token) == [
+        {
+            "restaurant_id": 1,
+            "restaurant": "restaurant1",
+            "title": None,
+            "items": items,
+        },
+        {"restaurant_id": 2, "restaurant": "restaurant2", "title": None, "items": []},
+    ]
+
+
+def test_today_is_served_from_cache_until_menus_change(
+    client: TestClient,
+    restaurateur_auth_token: str,
+    employee_auth_token: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    builds = 0
+    get_today_uncounted = crud.get_today
+
+    def counted(*args: Any) -> list[Any]:
+        nonlocal builds
+        builds += 1
+        return get_today_uncounted(*args)
+
+    monkeypatch.setattr(crud, "get_today", counted)
+
+    first = get_today(client, employee_auth_token)
+    assert get_today(client, employee_auth_token) == first
+    assert builds <= 1  # Unless it wasn't warm yet.
+
+    builds = 0
+    items = add_items(
+        client, restaurateur_auth_token, Weekdays.of(datetime.now().date())
+    )
+    assert get_today(client, employee_auth_token)[0]["items"] == items
+    assert builds == 1
+
+    r = client.patch(
+        "/menu",
+        json={"op": "delete", "ids": [items[0]["id"]]},
+        headers={"Authorization": f"Bearer {restaurateur_auth_token}"},
+    )
+    assert r.status_code == status.HTTP_200_OK
+    assert get_today(client, employee_auth_token)[0]["items"] == []
+    assert builds == 2
+
+
+def test_today_sees_menu_changes_made_by_other_processes(
+    client: TestClient, employee_auth_token: str
+) -> None:
+    assert get_today(client, employee_auth_token)[0]["items"] == []
+
+    # As another worker would, its ``_menu_generation`` isn't this process'.
+    with SessionLocal() as db:
+        db.execute(insert(models.Item).values(id=1, name="Khichuri", price=120))
+        db.execute(
+            insert(models.MenuItem).values(
+                restaurant_id=1, day=Weekdays.of(datetime.now().date()), item_id=1
+            )
+        )
+        db.execute(
+            update(models.MenuGeneration).values(
+                generation=models.MenuGeneration.generation + 1
+            )
+        )
+        db.commit()
+    before = crud.menu_generation()
+
+    assert [i["name"] for i in get_today(client, employee_auth_token)[0]["items"]] == [
+        "Khichuri"
+    ]
+    assert crud.menu_generation() == before
+
+
+def test_only_employees_get_today(
+    client: TestClient, restaurateur_auth_token: str
+) -> None:
+    r = client.get(
+        "/today", headers={"Authorization": f"Bearer {restaurateur_auth_token}"}
+    )
+    assert r.status_code == status.HTTP_403_FORBIDDEN
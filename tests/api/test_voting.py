@@ -1,9 +1,14 @@
+from datetime import date, datetime, time
+
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 from freezegun import freeze_time
 
 import auth
+import crud
 import models
+from database import SessionLocal
 
 
 @freeze_time("2023-10-26 9:00:00")
@@ -66,3 +71,106 @@ def test_vote_only_before_lunch(client: TestClient) -> None:
         ).status_code
         == status.HTTP_403_FORBIDDEN
     )
+
+
+def test_employee_cannot_see_vote_stats(
+    client: TestClient, employee_auth_token: str
+) -> None:
+    assert (
+        client.get(
+            "/stats/votes?from=2023-10-01&to=2023-10-31&group=month",
+            headers={"Authorization": f"Bearer {employee_auth_token}"},
+        ).status_code
+        == status.HTTP_403_FORBIDDEN
+    )
+
+
+def test_admin_sees_vote_stats(client: TestClient, admin_auth_token: str) -> None:
+    r = client.get(
+        "/stats/votes?from=2023-10-01&to=2023-10-31",
+        headers={"Authorization": f"Bearer {admin_auth_token}"},
+    )
+    assert r.status_code == status.HTTP_200_OK
+    assert r.json() == []
+
+
+@freeze_time("2023-10-26 9:00:00")
+def test_vote_candidates(client: TestClient) -> None:
+    new_auth_token_for_employee = auth.create_access_token(
+        2, "employee1", models.Roles.EMPLOYEE
+    ).access_token
+    r = client.get(
+        "/vote/candidates",
+        headers={"Authorization": f"Bearer {new_auth_token_for_employee}"},
+    )
+    assert r.status_code == status.HTTP_200_OK
+    assert r.json() == [
+        {"id": 1, "name": "restaurant1"},
+        {"id": 2, "name": "restaurant2"},
+    ]
+
+
+@freeze_time("2023-10-26 9:00:00")
+def test_vote_for_unknown_restaurant(client: TestClient) -> None:
+    new_auth_token_for_employee = auth.create_access_token(
+        2, "employee1", models.Roles.EMPLOYEE
+    ).access_token
+    assert (
+        client.post(
+            "/vote/1337",
+            headers={"Authorization": f"Bearer {new_auth_token_for_employee}"},
+        ).status_code
+        == status.HTTP_404_NOT_FOUND
+    )
+
+
+def get_winners(client: TestClient) -> list[dict[str, object]]:
+    token = auth.create_access_token(2, "employee1", models.Roles.EMPLOYEE)
+    r = client.get(
+        "/vote/winners",
+        headers={"Authorization": f"Bearer {token.access_token}"},
+    )
+    assert r.status_code == status.HTTP_200_OK
+    return r.json()  # type: ignore[no-any-return]
+
+
+def test_first_winners_read_after_the_deadline_finalizes(client: TestClient) -> None:
+    # Votes are dated by the database, which doesn't see the frozen clock.
+    today = date.today()
+    with freeze_time(datetime.combine(today, time(9))):
+        for user_id, username in ((2, "employee1"), (4, "employee2")):
+            token = auth.create_access_token(user_id, username, models.Roles.EMPLOYEE)
+            r = client.post(
+                "/vote/1", headers={"Authorization": f"Bearer {token.access_token}"}
+            )
+            assert r.status_code == status.HTTP_202_ACCEPTED
+        assert get_winners(client) == []
+
+    with freeze_time(datetime.combine(today, time(12))):
+        expected = [
+            {"restaurant": "restaurant1", "votes": 2, "voting_date": today.isoformat()}
+        ]
+        assert get_winners(client) == expected
+        assert get_winners(client) == expected  # Computed once, read back.
+
+
+def test_winners_read_after_the_worker_finalized_doesnt_write(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    today = date.today()
+    with freeze_time(datetime.combine(today, time(9))):
+        token = auth.create_access_token(2, "employee1", models.Roles.EMPLOYEE)
+        r = client.post(
+            "/vote/1", headers={"Authorization": f"Bearer {token.access_token}"}
+        )
+        assert r.status_code == status.HTTP_202_ACCEPTED
+
+    with freeze_time(datetime.combine(today, time(12))):
+        with SessionLocal() as db:
+            crud.compute_winner(db, today)  # As the worker would.
+
+        def computed_again(*_: object) -> None:
+            raise AssertionError("computed again")
+
+        monkeypatch.setattr(crud, "_compute_winner", computed_again)
+        assert [w["restaurant"] for w in get_winners(client)] == ["restaurant1"]
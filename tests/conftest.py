@@ -4,14 +4,16 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session, close_all_sessions, sessionmaker
 
+import catalog
+import crud
 import models
 import schemas
 from auth import create_access_token
 from config import get_settings
-from crud import create_root_user
+from crud import create_root_user, migrate
 from database import SessionLocal
-from main import app
-from models import Base, Roles, Weekdays
+from main import app, login_limits
+from models import Base, Roles
 
 
 # This one is for the crud tests to use.
@@ -49,8 +51,11 @@ def create_dummy_data(
         if session.bind is not None:
             close_all_sessions()
             Base.metadata.drop_all(session.bind)
-            Base.metadata.create_all(session.bind)
-        session.commit()
+        migrate(session)
+    crud._candidates.clear()
+    crud._today_feed.clear()
+    crud._finalized = None
+    catalog.reset()
 
     restaurants = [
         schemas.RestaurantCreate(name="restaurant1"),
@@ -83,16 +88,7 @@ def create_dummy_data(
         create_root_user(session)
 
         for r in restaurants:
-            empty_menus = [
-                models.DailyMenu(
-                    **(schemas.DailyMenuCreate(day=dm, items=[])).model_dump()
-                )
-                for dm in Weekdays
-            ]
-
-            session.add(
-                models.Restaurant(**(r.model_dump() | {"daily_menus": empty_menus}))
-            )
+            session.add(models.Restaurant(**r.model_dump()))
 
         for u in users:
             session.add(models.User(**u.model_dump()))
@@ -103,5 +99,7 @@ def create_dummy_data(
 @pytest.fixture
 def client() -> Generator[TestClient, None, None]:
     create_dummy_data()
+    for limit in login_limits.values():
+        limit.reset()
     with TestClient(app) as c:
         yield c
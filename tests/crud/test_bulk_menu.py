@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import crud
+import models
+import schemas
+from config import get_settings
+from database import SessionLocal
+from models import Weekdays
+
+
+@pytest.fixture(params=["chunks", "temp table"])
+def batching(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_settings(), "IN_CHUNK_SIZE", 2)
+    threshold = 100 if request.param == "chunks" else 3
+    monkeypatch.setattr(get_settings(), "IN_TEMP_TABLE_THRESHOLD", threshold)
+
+
+def add_items(db: Session, restaurant_id: int, n: int) -> list[int]:
+    items = crud.add_items(
+        db,
+        restaurant_id,
+        None,
+        [
+            schemas.ItemCreate(name=f"item{restaurant_id}-{i}", price=100)
+            for i in range(n)
+        ],
+    )
+    return [i.id for i in items]
+
+
+def test_bulk_menu_operations(db: Session, batching: None) -> None:
+    ids = add_items(db, 1, 7)
+    others = add_items(db, 2, 2)
+    days = [Weekdays.SUNDAY, Weekdays.MONDAY]
+
+    # Another restaurant's items, and ones already on the menu, are skipped.
+    assert crud.add_item_to_daily_menu(db, 1, days, ids[:5] + others) == 10
+    assert crud.add_item_to_daily_menu(db, 1, days, ids) == 4
+    assert len(crud.get_items(db, 1, Weekdays.SUNDAY)) == 7
+    assert crud.get_items(db, 2, None) != []
+
+    assert crud.remove_item_from_daily_menu(db, 1, [Weekdays.SUNDAY], ids) == 7
+    assert crud.get_items(db, 1, Weekdays.SUNDAY) == []
+    assert len(crud.get_items(db, 1, Weekdays.MONDAY)) == 7
+
+    assert crud.delete_items(db, 1, ids[:6] + others) == 6
+    db.commit()
+    assert [i.id for i in crud.get_items(db, 1, None, all=True)] == ids[6:]
+    assert len(crud.get_items(db, 2, None, all=True)) == 2
+
+
+def test_bulk_menu_operations_with_days_mask(
+    db: Session, batching: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings(), "MENU_DAYS_MASK", True)
+    ids = add_items(db, 1, 7)
+    others = add_items(db, 2, 2)
+    days = [Weekdays.SUNDAY, Weekdays.MONDAY]
+
+    # Counts items changed, rather than days added to them.
+    assert crud.add_item_to_daily_menu(db, 1, days, ids[:5] + others) == 5
+    assert crud.add_item_to_daily_menu(db, 1, days, ids) == 2
+    assert len(crud.get_items(db, 1, Weekdays.SUNDAY)) == 7
+    assert crud.get_items(db, 2, None) != []
+    sunday = crud.get_today(db, date(2023, 1, 1))
+    assert [len(m.items) for m in sunday] == [7, 0]
+
+    assert crud.remove_item_from_daily_menu(db, 1, [Weekdays.SUNDAY], ids) == 7
+    assert crud.get_items(db, 1, Weekdays.SUNDAY) == []
+    assert len(crud.get_items(db, 1, Weekdays.MONDAY)) == 7
+    assert crud.search_items(db, "item1", Weekdays.MONDAY) != []
+    assert crud.search_items(db, "item1", Weekdays.SUNDAY) == []
+
+    assert crud.delete_items(db, 1, ids[:6] + others) == 6
+    db.commit()
+    assert [i.id for i in crud.get_items(db, 1, None, all=True)] == ids[6:]
+
+
+def test_sync_menu_storage_moves_menus_both_ways(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    ids = add_items(db, 1, 3)
+    crud.add_item_to_daily_menu(db, 1, [Weekdays.SUNDAY, Weekdays.FRIDAY], ids[:2])
+    db.commit()
+
+    monkeypatch.setattr(get_settings(), "MENU_DAYS_MASK", True)
+    assert crud.sync_menu_storage(db) is True
+    assert crud.sync_menu_storage(db) is False
+    assert db.scalars(select(models.MenuItem)).all() == []
+    friday = [i.id for i in crud.get_items(db, 1, Weekdays.FRIDAY)]
+    assert friday == ids[:2]
+    assert [i.id for i in crud.get_items(db, 1, None)] == ids[2:]
+
+    monkeypatch.setattr(get_settings(), "MENU_DAYS_MASK", False)
+    assert crud.sync_menu_storage(db) is True
+    assert db.scalars(select(models.Item.days).distinct()).all() == [0]
+    assert [i.id for i in crud.get_items(db, 1, Weekdays.SUNDAY)] == ids[:2]
+    assert [i.id for i in crud.get_items(db, 1, None)] == ids[2:]
+
+
+def test_concurrent_syncs_move_menus_once(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(get_settings(), "MENU_DAYS_MASK", True)
+    ids = add_items(db, 1, 3)
+    crud.add_item_to_daily_menu(db, 1, [Weekdays.SUNDAY, Weekdays.FRIDAY], ids[:2])
+    db.commit()
+    monkeypatch.setattr(get_settings(), "MENU_DAYS_MASK", False)
+
+    def sync() -> bool:
+        with SessionLocal() as session:
+            return crud.sync_menu_storage(session)
+
+    with ThreadPoolExecutor(4) as pool:
+        moved = list(pool.map(lambda _: sync(), range(4)))
+
+    assert sorted(moved) == [False, False, False, True]
+    assert [i.id for i in crud.get_items(db, 1, Weekdays.FRIDAY)] == ids[:2]
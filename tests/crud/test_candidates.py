@@ -0,0 +1,126 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import crud
+import database
+from models import Restaurant, VoteCandidate, VoteWinner
+from schemas import RestaurantCreate
+
+thursday = date(2023, 10, 26)
+sunday = date(2023, 10, 29)
+
+
+def test_two_day_winner_is_not_a_candidate(db: Session) -> None:
+    db.add_all(
+        [
+            VoteWinner(restaurant_id=1, votes=3, voting_date=date(2023, 10, 25)),
+            VoteWinner(restaurant_id=2, votes=3, voting_date=date(2023, 10, 25)),
+            VoteWinner(restaurant_id=1, votes=2, voting_date=thursday),
+        ]
+    )
+    db.commit()
+
+    # The weekend in between doesn't reset the streak.
+    assert crud.get_candidates(db, sunday) == {2}
+    assert crud.get_candidates(db, thursday) == {1, 2}
+
+    persisted = db.query(VoteCandidate).where(VoteCandidate.voting_date == sunday)
+    assert [c.restaurant_id for c in persisted] == [2]
+
+
+def test_new_restaurant_is_a_candidate(db: Session) -> None:
+    today = date.today()
+    assert crud.get_candidates(db, today) == {1, 2}
+
+    _, r = crud.create_restaurant(db, RestaurantCreate(name="newrestaurant"))
+    assert r is not None
+    assert crud.is_candidate(db, today, r.id)
+
+    crud._candidates.clear()
+    assert crud.get_candidates(db, today) == {1, 2, r.id}
+
+
+def test_misses_are_answered_from_the_cache(db: Session) -> None:
+    db.add_all(
+        [
+            VoteWinner(restaurant_id=1, votes=3, voting_date=date(2023, 10, 25)),
+            VoteWinner(restaurant_id=1, votes=2, voting_date=thursday),
+        ]
+    )
+    db.commit()
+    assert crud.get_candidates(db, sunday) == {2}
+
+    statements: list[str] = []
+
+    def executed(*args: Any) -> None:
+        statements.append(args[2])
+
+    event.listen(database.engine, "before_cursor_execute", executed)
+    try:
+        assert not crud.is_candidate(db, sunday, 1)  # Excluded.
+        assert statements == []
+        assert not crud.is_candidate(db, sunday, 0xDEAD)  # No such restaurant.
+        assert len(statements) == 1
+    finally:
+        event.remove(database.engine, "before_cursor_execute", executed)
+    assert crud._candidates[sunday] == {2}
+
+
+def test_restaurant_onboarded_by_another_process_is_a_candidate(db: Session) -> None:
+    today = date.today()
+    assert crud.get_candidates(db, today) == {1, 2}
+
+    # As another process would, without touching this one's cache.
+    db.add(Restaurant(id=3, name="elsewhere"))
+    db.add(VoteCandidate(voting_date=today, restaurant_id=3))
+    db.commit()
+
+    assert crud.is_candidate(db, today, 3)
+    assert crud._candidates[today] == {1, 2, 3}
+
+
+def test_day_without_candidates_is_computed_once(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    db.add_all(
+        [
+            VoteWinner(restaurant_id=i, votes=3, voting_date=d)
+            for i in (1, 2)
+            for d in (date(2023, 10, 25), thursday)
+        ]
+    )
+    db.commit()
+
+    computed: list[date] = []
+    compute = crud.compute_candidates
+
+    def counted(db: Session, voting_date: date) -> frozenset[int]:
+        computed.append(voting_date)
+        return compute(db, voting_date)
+
+    monkeypatch.setattr(crud, "compute_candidates", counted)
+    assert crud.get_candidates(db, sunday) == frozenset()
+    assert not crud.is_candidate(db, sunday, 1)
+    assert not crud.is_candidate(db, sunday, 2)
+    assert crud.get_candidates(db, sunday) == frozenset()
+    assert computed == [sunday]
+
+
+def test_candidate_cache_survives_concurrent_days() -> None:
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads as often as possible.
+    try:
+        days = [thursday + timedelta(days=i) for i in range(200)]
+        with ThreadPoolExecutor(8) as pool:
+            for _ in pool.map(lambda d: crud._cache_candidates(d, frozenset()), days):
+                pass
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert len(crud._candidates) == crud._CANDIDATE_DAYS_CACHED
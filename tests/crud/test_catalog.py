@@ -0,0 +1,129 @@
+import fcntl
+import json
+from collections.abc import Generator
+from mmap import mmap
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+import catalog
+import crud
+import models
+import schemas
+from config import get_settings
+from models import Weekdays
+
+
+@pytest.fixture
+def catalog_dir(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Generator[Path, None, None]:
+    monkeypatch.setattr(get_settings(), "CATALOG_DIR", str(tmp_path))
+    catalog.publish()
+    yield tmp_path
+    catalog._mapped = None
+
+
+def as_json(items: list[object]) -> list[dict[str, object]]:
+    return [schemas.Item.model_validate(i).model_dump() for i in items]
+
+
+def add_items(db: Session) -> None:
+    crud.add_items(db, 1, None, [schemas.ItemCreate(name="Water", price=20)])
+    crud.add_items(
+        db,
+        1,
+        [Weekdays.SUNDAY, Weekdays.MONDAY],
+        [schemas.ItemCreate(name="Rice", price=60, description="Plain")],
+    )
+    crud.add_items(db, 2, [Weekdays.MONDAY], [schemas.ItemCreate(name="Dal", price=40)])
+
+
+@pytest.mark.parametrize("days_mask", [False, True])
+def test_menus_match_the_database(
+    db: Session, catalog_dir: Path, monkeypatch: pytest.MonkeyPatch, days_mask: bool
+) -> None:
+    monkeypatch.setattr(get_settings(), "MENU_DAYS_MASK", days_mask)
+    add_items(db)
+    assert catalog.flush(5)
+
+    for restaurant_id in (1, 2):
+        for day in (None, *Weekdays):
+            for all in (False, True):
+                menu = catalog.menu(restaurant_id, day, all)
+                assert menu is not None
+                assert isinstance(menu.obj, mmap)  # Not a copy.
+                assert json.loads(bytes(menu)) == as_json(
+                    crud.get_items(db, restaurant_id, day, all)  # type: ignore[arg-type]
+                )
+
+
+def test_menu_writes_publish_a_new_generation(db: Session, catalog_dir: Path) -> None:
+    before = catalog.generation()
+    assert before is not None
+    assert json.loads(bytes(catalog.menu(1, None, True) or b"")) == []
+
+    add_items(db)
+    assert catalog.flush(5)
+
+    assert catalog.generation() == before + 3
+    assert [
+        i["name"] for i in json.loads(bytes(catalog.menu(1, None, True) or b""))
+    ] == [
+        "Water",
+        "Rice",
+    ]
+
+
+def test_publish_skips_when_the_catalog_is_recent_enough(
+    db: Session, catalog_dir: Path
+) -> None:
+    inode = (catalog_dir / "catalog.bin").stat().st_ino
+    assert catalog.publish(0)
+    assert (catalog_dir / "catalog.bin").stat().st_ino == inode
+
+    db.add(models.MenuGeneration(id=1, generation=2))
+    db.commit()
+    assert catalog.publish(2)
+    assert catalog.generation() == 2
+
+
+def test_a_failed_build_keeps_the_last_catalog(db: Session, catalog_dir: Path) -> None:
+    engine = create_engine(
+        get_settings().SQLALCHEMY_DATABASE_URL,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    with Session(engine) as writer:
+        writer.connection()  # The only connection.
+        assert not catalog.publish(1, sessionmaker(engine))
+    engine.dispose()
+
+    assert catalog.generation() == 0
+    assert catalog.menu(1, None, True) == b"[]"
+
+
+def test_writes_are_read_from_the_database_until_published(
+    db: Session, catalog_dir: Path
+) -> None:
+    with (catalog_dir / "catalog.lock").open("a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # Holds the publisher back.
+        add_items(db)
+        assert catalog.menu(1, None, True) is None
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+    assert catalog.flush(5)
+    assert len(json.loads(bytes(catalog.menu(1, None, True) or b""))) == 2
+
+
+def test_unknown_restaurants_and_no_catalog(
+    db: Session, catalog_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    assert catalog.menu(42, None, False) is None
+
+    monkeypatch.setattr(get_settings(), "CATALOG_DIR", None)
+    assert catalog.menu(1, None, False) is None
+    assert catalog.generation() is None
@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+import analytics
+import columnar
+from models import Vote, VoteWinner
+
+start = date(2023, 10, 1)
+
+
+def test_export_and_analytics(db: Session, tmp_path: Path) -> None:
+    # Employees are users 2 and 4, restaurants 1 and 2.
+    db.add_all(
+        [
+            Vote(user_id=2, restaurant_id=1, voting_date=start),
+            Vote(user_id=4, restaurant_id=1, voting_date=start),
+            Vote(user_id=2, restaurant_id=2, voting_date=start + timedelta(days=1)),
+            Vote(user_id=2, restaurant_id=1, voting_date=start + timedelta(days=3)),
+            VoteWinner(restaurant_id=1, votes=2, voting_date=start),
+            VoteWinner(restaurant_id=2, votes=1, voting_date=start + timedelta(days=1)),
+            VoteWinner(restaurant_id=1, votes=1, voting_date=start + timedelta(days=2)),
+            VoteWinner(restaurant_id=1, votes=1, voting_date=start + timedelta(days=3)),
+        ]
+    )
+    db.commit()
+
+    columnar.export(db, tmp_path, chunk_size=3)
+    snapshot = columnar.load(tmp_path)
+    assert snapshot.employees == 2
+    assert snapshot.votes.user_id.tolist() == [2, 4, 2, 2]
+    assert snapshot.winners.votes.tolist() == [2, 1, 1, 1]
+
+    day, restaurant_id, n = analytics.daily_counts(snapshot.votes, chunk_size=3)
+    assert [
+        (date.fromordinal(d), r, c)
+        for d, r, c in zip(day.tolist(), restaurant_id.tolist(), n.tolist())
+    ] == [
+        (start, 1, 2),
+        (start + timedelta(days=1), 2, 1),
+        (start + timedelta(days=3), 1, 1),
+    ]
+
+    day, rate = analytics.participation(snapshot.votes, snapshot.employees, 3)
+    assert [date.fromordinal(d) for d in day.tolist()] == [
+        start,
+        start + timedelta(days=1),
+        start + timedelta(days=3),
+    ]
+    assert rate.tolist() == [1.0, 0.5, 0.5]
+
+    restaurant_id, streak = analytics.win_streaks(snapshot.winners)
+    assert dict(zip(restaurant_id.tolist(), streak.tolist())) == {1: 2, 2: 1}
+
+
+def test_export_empty_history(db: Session, tmp_path: Path) -> None:
+    snapshot = columnar.export(db, tmp_path)
+
+    assert len(snapshot.votes.day) == 0
+    assert len(analytics.daily_counts(snapshot.votes)[0]) == 0
+    assert len(analytics.participation(snapshot.votes, snapshot.employees)[0]) == 0
+    assert len(analytics.win_streaks(snapshot.winners)[0]) == 0
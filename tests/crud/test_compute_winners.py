@@ -1,32 +1,41 @@
+from datetime import date, datetime, time
+
+from freezegun import freeze_time
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from crud import (compute_winner, create_restaurant, create_user, get_winners,
-                  vote)
-from models import Restaurant, Roles, User
-from schemas import RestaurantCreate, UserCreate
+from crud import (backfill_vote_daily_totals, compute_winner,
+                  create_restaurant, create_user, finalize_winner,
+                  get_vote_stats, get_winners, vote)
+from models import Restaurant, Roles, User, VoteDailyTotal
+from schemas import RestaurantCreate, StatsPeriod, UserCreate
 
 
 def create_dummy_employees(db: Session, n: int) -> list[User]:
     u = []
     for i in range(n):
-        u.append(
-            create_user(
-                db,
-                UserCreate(
-                    username=f"autouser{i}",
-                    email=f"autoemail{i}@email.com",
-                    role=Roles.EMPLOYEE,
-                    password=f"autopass{i}",
-                ),
-            )
+        _, user, _ = create_user(
+            db,
+            UserCreate(
+                username=f"autouser{i}",
+                email=f"autoemail{i}@email.com",
+                role=Roles.EMPLOYEE,
+                password=f"autopass{i}",
+            ),
         )
+        assert user is not None
+        u.append(user)
     return u
 
 
 def create_dummy_restaurants(db: Session, n: int) -> list[Restaurant]:
     r = []
     for i in range(n):
-        r.append(create_restaurant(db, RestaurantCreate(name=f"autorestaurant{i}")))
+        _, restaurant = create_restaurant(
+            db, RestaurantCreate(name=f"autorestaurant{i}")
+        )
+        assert restaurant is not None
+        r.append(restaurant)
     return r
 
 
@@ -75,3 +84,71 @@ def test_multiple_winners(db: Session) -> None:
 
     assert len(w) == 3, "Could not ensure multuple winner"
     assert w == u, "Winners are not the same"
+
+
+def test_finalize_winner_commits_on_its_own_session(db: Session) -> None:
+    r = distribute_votes(db, [2, 1])
+    db.add(Restaurant(name="uncommitted"))
+
+    today = date.today()
+    with freeze_time(datetime.combine(today, time(23, 59))):
+        finalize_winner(today)
+    db.rollback()
+
+    assert [(w.restaurant_id, w.votes) for w in get_winners(db, today)] == [
+        (r[0][0].id, 2)
+    ]
+    assert db.scalar(select(Restaurant).where(Restaurant.name == "uncommitted")) is None
+
+
+def test_compute_winner_records_daily_totals(db: Session) -> None:
+    r = distribute_votes(db, [3, 1, 2])
+    compute_winner(db)
+
+    totals = {t.restaurant_id: t.votes for t in db.query(VoteDailyTotal).all()}
+    assert totals == {i[0].id: i[1] for i in r}
+
+    db.query(VoteDailyTotal).delete()
+    assert backfill_vote_daily_totals(db) == 3
+    assert totals == {t.restaurant_id: t.votes for t in db.query(VoteDailyTotal).all()}
+
+
+def test_vote_stats_shares(db: Session) -> None:
+    r = distribute_votes(db, [3, 1])
+    compute_winner(db)
+
+    today = datetime.today().date()
+    for period in StatsPeriod:
+        stats = get_vote_stats(db, today, today, period)
+        assert [(s.restaurant_id, s.votes, s.share) for s in stats] == [
+            (r[0][0].id, 3, 0.75),
+            (r[1][0].id, 1, 0.25),
+        ]
+
+    stats = get_vote_stats(db, today, today, StatsPeriod.WEEK, r[1][0].id)
+    assert [(s.restaurant_id, s.share) for s in stats] == [(r[1][0].id, 0.25)]
+
+
+def test_vote_stats_periods(db: Session) -> None:
+    for day, votes in [("2023-01-07", 1), ("2023-01-08", 2), ("2023-02-01", 4)]:
+        db.add(
+            VoteDailyTotal(
+                voting_date=date.fromisoformat(day), restaurant_id=1, votes=votes
+            )
+        )
+    db.add(VoteDailyTotal(voting_date=date(2023, 1, 8), restaurant_id=2, votes=2))
+    db.commit()
+
+    start, end = date(2023, 1, 1), date(2023, 2, 28)
+    weeks = get_vote_stats(db, start, end, StatsPeriod.WEEK)
+    assert [(s.period_start.isoformat(), s.votes, s.share) for s in weeks] == [
+        ("2023-01-01", 1, 1.0),  # Saturday, back to Sunday.
+        ("2023-01-08", 2, 0.5),  # A Sunday starts its own week.
+        ("2023-01-08", 2, 0.5),
+        ("2023-01-29", 4, 1.0),
+    ]
+    months = get_vote_stats(db, start, end, StatsPeriod.MONTH, restaurant_id=1)
+    assert [(s.period_start.isoformat(), s.votes, s.share) for s in months] == [
+        ("2023-01-01", 3, 0.6),
+        ("2023-02-01", 4, 1.0),
+    ]
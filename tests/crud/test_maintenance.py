@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, delete, insert, text
+from sqlalchemy.orm import Session
+
+import crud
+import maintenance
+import models
+
+
+def test_purges_expired_refresh_tokens(db: Session) -> None:
+    now = datetime.utcnow()
+    crud.create_refresh_token(db, 2, "expired", now - timedelta(seconds=1))
+    crud.create_refresh_token(db, 2, "valid", now + timedelta(days=1))
+    db.commit()
+
+    assert maintenance.run().refresh_tokens_purged == 1
+    assert db.query(models.RefreshToken.token_hash).all() == [("valid",)]
+
+
+def test_reclaims_free_pages_of_new_databases(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite3'}")
+    models.Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.execute(
+            insert(models.Restaurant),
+            [{"name": f"restaurant{i}" * 20} for i in range(5000)],
+        )
+        db.commit()
+        db.execute(delete(models.Restaurant))
+        db.commit()
+        free = db.scalar(text("PRAGMA freelist_count"))
+        page_size = db.scalar(text("PRAGMA page_size"))
+
+    report = maintenance.run(engine)
+
+    assert free and page_size
+    # ``ANALYZE`` takes a few of them for its statistics.
+    assert report.reclaimed_bytes >= (free - 5) * page_size
+    assert report.free_bytes_left == 0
+    engine.dispose()
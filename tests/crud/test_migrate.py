@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import insert, inspect, select, text
+from sqlalchemy.orm import Session
+
+import crud
+import models
+import schemas
+from database import SessionLocal
+
+
+def test_migrate_is_a_noop_when_up_to_date(db: Session) -> None:
+    assert crud.get_schema_version(db) == models.SCHEMA_VERSION
+    assert crud.migrate(db) is False
+
+
+def test_migrate_stamps_databases_that_predate_versioning(db: Session) -> None:
+    db.query(models.SchemaVersion).delete()
+    db.commit()
+
+    assert crud.get_schema_version(db) is None
+    assert crud.migrate(db) is True
+    assert crud.get_schema_version(db) == models.SCHEMA_VERSION
+
+
+def test_migrate_indexes_existing_items_for_search(db: Session) -> None:
+    crud.add_items(db, 1, None, [schemas.ItemCreate(name="Chicken Curry", price=300)])
+    db.execute(text(f"DROP TABLE {models.ITEMS_FTS}"))
+    db.query(models.SchemaVersion).update({"version": 4})
+    db.commit()
+    crud._item_search.clear()
+
+    assert crud.migrate(db) is True
+    assert [i.name for i in crud.search_items(db, "curry")] == ["Chicken Curry"]
+
+
+def test_migrate_moves_menus_to_restaurant_and_day(db: Session) -> None:
+    crud.add_items(db, 1, None, [schemas.ItemCreate(name="Chicken Curry", price=300)])
+    db.execute(
+        text(
+            "CREATE TABLE items_daily_menus (item_id INTEGER, daily_menu_id INTEGER,"
+            " PRIMARY KEY (item_id, daily_menu_id))"
+        )
+    )
+    db.execute(
+        insert(models.DailyMenu),
+        [
+            {"restaurant_id": 1, "day": models.Weekdays.MONDAY, "title": None},
+            {"restaurant_id": 1, "day": models.Weekdays.FRIDAY, "title": "Fish day"},
+        ],
+    )
+    db.execute(text("INSERT INTO items_daily_menus VALUES (1, 1), (1, 2)"))
+    db.query(models.SchemaVersion).update({"version": 5})
+    db.commit()
+
+    assert crud.migrate(db) is True
+    for day in (models.Weekdays.MONDAY, models.Weekdays.FRIDAY):
+        assert [i.name for i in crud.get_items(db, 1, day)] == ["Chicken Curry"]
+    assert crud.get_items(db, 1, None) == []
+    assert db.scalars(select(models.DailyMenu.title)).all() == ["Fish day"]
+    assert not inspect(db.connection()).has_table("items_daily_menus")
+
+
+def test_migrate_adds_item_days(db: Session) -> None:
+    crud.add_items(db, 1, None, [schemas.ItemCreate(name="Chicken Curry", price=300)])
+    db.execute(text("DROP INDEX ix_items_restaurant_days"))
+    db.execute(text("ALTER TABLE items DROP COLUMN days"))
+    db.query(models.SchemaVersion).update({"version": 6})
+    db.commit()
+
+    assert crud.migrate(db) is True
+    assert db.scalars(select(models.Item.days)).all() == [0]
+    indexes = inspect(db.connection()).get_indexes(models.Item.__tablename__)
+    assert "ix_items_restaurant_days" in {i["name"] for i in indexes}
+
+
+def test_migrate_indexes_vote_daily_totals(db: Session) -> None:
+    db.execute(text("DROP INDEX ix_vote_daily_totals_restaurant"))
+    db.query(models.SchemaVersion).update({"version": 8})
+    db.commit()
+
+    assert crud.migrate(db) is True
+    indexes = inspect(db.connection()).get_indexes(models.VoteDailyTotal.__tablename__)
+    assert "ix_vote_daily_totals_restaurant" in {i["name"] for i in indexes}
+
+
+def test_concurrent_migrations_upgrade_once(db: Session) -> None:
+    db.execute(
+        text(
+            "CREATE TABLE items_daily_menus (item_id INTEGER, daily_menu_id INTEGER,"
+            " PRIMARY KEY (item_id, daily_menu_id))"
+        )
+    )
+    db.query(models.SchemaVersion).update({"version": 5})
+    db.commit()
+
+    def migrate() -> bool:
+        with SessionLocal() as session:
+            return crud.migrate(session)
+
+    with ThreadPoolExecutor(4) as pool:
+        upgraded = list(pool.map(lambda _: migrate(), range(4)))
+
+    assert sorted(upgraded) == [False, False, False, True]
+    assert crud.get_schema_version(db) == models.SCHEMA_VERSION
@@ -1,21 +1,19 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 import crud
+import models
 from models import Weekdays
 from schemas import RestaurantCreate
 
 
-def test_create_restaurant_creates_empty_daily_menus(db: Session) -> None:
-    r = crud.create_restaurant(
+def test_create_restaurant_has_empty_daily_menus(db: Session) -> None:
+    _, r = crud.create_restaurant(
         db, RestaurantCreate(name="someTestRestaurant1", description="description")
     )
+    assert r is not None
 
-    assert len(r.daily_menus) == 7
-    assert all(
-        [
-            i.day == j
-            for i, j in zip(
-                sorted(r.daily_menus, key=lambda x: x.day), sorted(Weekdays)
-            )
-        ]
-    )
+    # Menus are implicit, no rows until one gets a title.
+    assert r.daily_menus == []
+    assert db.scalars(select(models.MenuItem)).all() == []
+    assert all(crud.get_items(db, r.id, day) == [] for day in Weekdays)
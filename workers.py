@@ -1,9 +1,14 @@
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any
+
 from celery import Celery
 from celery.schedules import crontab
-from celery.utils.log import get_task_logger
-from sqlalchemy.exc import IntegrityError
+from celery.signals import setup_logging
 
 import crud
+import log
+import maintenance
 from config import get_settings
 
 BROKER_URL = "sqla+" + get_settings().SQLALCHEMY_DATABASE_URL
@@ -11,34 +16,59 @@ app = Celery(broker=BROKER_URL, broker_connection_retry_on_startup=False)
 app.conf.enable_utc = False
 
 
-logger = get_task_logger(__name__)
+logger = logging.getLogger(__name__)
+
+
+@setup_logging.connect
+def use_structured_logging(**_: Any) -> None:
+    """
+    Connecting to this signal keeps Celery from configuring logging itself.
+    """
+    log.setup()
 
 
 @app.task
 def compute_winner() -> None:
     try:
-        winners = crud.compute_winner()
-        logger.info(
-            "winners = list[tuple[restaurant_id: int, vote_count: int]] = %s", winners
-        )
-    except IntegrityError as e:
-        if (
-            e.orig is not None
-            and isinstance(e.orig.args[0], str)
-            and e.orig.args[0].lower().count("unique")
-        ):
-            logger.warn("winner already computed")
-            return
+        outcome, _ = crud.compute_winner()
+        if outcome == crud.Outcome.CONFLICT:
+            logger.warning("winner already computed")
+    except Exception:
         logger.exception("could not compute winner")
 
 
-t = get_settings().VOTING_ENDS_AT
+@app.task
+def maintain_database() -> None:
+    try:
+        maintenance.run()
+    except Exception:
+        logger.exception("could not maintain the database")
+
+
+@app.task
+def arm_compute_winner() -> None:
+    """
+    Beat only fires on the minute, this has ``compute_winner`` run on the deadline's second.
+    """
+    # Runs a minute before the deadline, which may be past midnight. If it runs late, the eta
+    # is past and ``compute_winner`` runs right away.
+    deadline = crud.voting_ends((datetime.now() + timedelta(minutes=1)).date())
+    compute_winner.apply_async(eta=deadline.astimezone())
+
+
+# A minute early, in case ``VOTING_ENDS_AT`` has seconds.
+t = (crud.voting_ends(date.today()) - timedelta(minutes=1)).time()
+m = get_settings().MAINTENANCE_AT
 
 
 # add "birthdays_today" task to the beat schedule
 app.conf.beat_schedule = {
     "periodic": {
-        "task": "workers.compute_winner",
+        "task": "workers.arm_compute_winner",
         "schedule": crontab(hour=t.hour, minute=t.minute),
-    }
+    },
+    "maintenance": {
+        "task": "workers.maintain_database",
+        "schedule": crontab(hour=m.hour, minute=m.minute),
+    },
 }